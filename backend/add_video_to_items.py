@@ -43,15 +43,23 @@ def add_video_to_items():
             # Удаляем существующие медиа для этого блюда
             ItemMedia.objects.filter(item=item).delete()
             
-            # Создаем медиа ассет
-            media_asset = MediaAsset.objects.create(
-                tenant=item.tenant,  # Добавляем tenant
+            # Одно видео — один медиа ассет тенанта, даже если оно у нескольких блюд.
+            # Прежние версии скрипта создавали дубликаты с тем же URL: берём старейший
+            # (объединить их можно командой dedupe_media)
+            media_asset = MediaAsset.objects.filter(
+                tenant=item.tenant,
                 type='video',
                 original_url=video_data['full'],
-                poster_url=video_data['poster'],
-                duration_seconds=30,  # 30 секунд
-            )
-            print(f"Создан медиа ассет: {media_asset.id}")
+            ).order_by('id').first()
+            created = media_asset is None
+            if created:
+                media_asset = MediaAsset.objects.create(
+                    tenant=item.tenant,
+                    type='video',
+                    original_url=video_data['full'],
+                    poster_url=video_data['poster'],
+                )
+            print(f"{'Создан' if created else 'Используется'} медиа ассет: {media_asset.id}")
             
             # Создаем превью видео
             preview_media = ItemMedia.objects.create(
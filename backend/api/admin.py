@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, Tenant, Location, Menu, Category, Item, Price, 
-    MediaAsset, ItemMedia, AnalyticsEvent, QRCode
+    MediaAsset, ItemMedia, AnalyticsEvent, AnalyticsRollup, QRCode
 )
 
 
@@ -66,6 +66,12 @@ class AnalyticsEventAdmin(admin.ModelAdmin):
     search_fields = ['session_id']
 
 
+@admin.register(AnalyticsRollup)
+class AnalyticsRollupAdmin(admin.ModelAdmin):
+    list_display = ['type', 'tenant', 'granularity', 'bucket', 'item', 'count']
+    list_filter = ['granularity', 'type', 'tenant']
+
+
 @admin.register(QRCode)
 class QRCodeAdmin(admin.ModelAdmin):
     list_display = ['name', 'tenant', 'location', 'created_at']
@@ -0,0 +1,245 @@
+"""Приём событий аналитики"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AnalyticsEvent, Category, Item
+from .serializers import AnalyticsEventInputSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_events(tenant, raw_events):
+    """Проверяет пачку событий за один проход.
+
+    Возвращает несохранённые AnalyticsEvent и список ошибок вида
+    {'index': номер события в пачке, 'errors': {...}}.
+    """
+    now = timezone.now()
+    validated = []
+    errors = []
+    for index, raw in enumerate(raw_events):
+        serializer = AnalyticsEventInputSerializer(data=raw)
+        if serializer.is_valid():
+            validated.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # Принадлежность категорий и блюд тенанту проверяем двумя запросами на всю пачку
+    category_ids = {data['category_id'] for _, data in validated if data.get('category_id')}
+    item_ids = {data['item_id'] for _, data in validated if data.get('item_id')}
+    known_categories = set(
+        Category.objects.filter(tenant=tenant, id__in=category_ids).values_list('id', flat=True)
+    ) if category_ids else set()
+    known_items = set(
+        Item.objects.filter(tenant=tenant, id__in=item_ids).values_list('id', flat=True)
+    ) if item_ids else set()
+
+    events = []
+    for index, data in validated:
+        event_errors = {}
+        if data.get('category_id') and data['category_id'] not in known_categories:
+            event_errors['category_id'] = ['Категория не найдена']
+        if data.get('item_id') and data['item_id'] not in known_items:
+            event_errors['item_id'] = ['Блюдо не найдено']
+        if event_errors:
+            errors.append({'index': index, 'errors': event_errors})
+            continue
+
+        events.append(AnalyticsEvent(
+            tenant=tenant,
+            session_id=data['session_id'],
+            type=data['type'],
+            category_id=data.get('category_id'),
+            item_id=data.get('item_id'),
+            metadata_json=data.get('metadata', {}),
+            # Часы клиента могут спешить: события из будущего не принимаем
+            timestamp=min(data.get('timestamp') or now, now),
+        ))
+
+    errors.sort(key=lambda error: error['index'])
+    return events, errors
+
+
+def write_events(events):
+    """Записывает события одним bulk_create в транзакции"""
+    if not events:
+        return []
+    with transaction.atomic():
+        return AnalyticsEvent.objects.bulk_create(
+            events, batch_size=settings.ANALYTICS_BULK_BATCH_SIZE
+        )
+
+
+class AnalyticsBuffer:
+    """Буфер отложенной записи событий в пределах одного воркера.
+
+    События копятся в памяти и сбрасываются одним bulk_create фоновым
+    потоком при накоплении flush_events штук или раз в flush_interval секунд,
+    а также при завершении процесса. Размер буфера ограничен max_events;
+    при переполнении новые события либо отбрасываются (overflow='drop'),
+    либо вызывающий поток сам сбрасывает буфер (overflow='block').
+    Счётчики stats() пишутся в лог при переполнении и при остановке.
+    """
+
+    def __init__(self, max_events=10000, flush_events=500, flush_interval=2.0, overflow='drop'):
+        self.max_events = max_events
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._stopped = False
+        self.counters = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'backpressure': 0,
+            'flushes': 0,
+            'failed': 0,
+        }
+
+    def enqueue(self, events):
+        """Ставит события в очередь, возвращает число принятых"""
+        self._ensure_thread()
+        accepted = dropped = blocked = 0
+        for event in events:
+            with self._lock:
+                if len(self._queue) >= self.max_events:
+                    if self.overflow != 'block':
+                        self.counters['dropped'] += 1
+                        dropped += 1
+                        continue
+                    self.counters['backpressure'] += 1
+                    blocked += 1
+                    full = True
+                else:
+                    full = False
+                    self._queue.append(event)
+                    self.counters['enqueued'] += 1
+                    accepted += 1
+                    if len(self._queue) >= self.flush_events:
+                        self._wakeup.notify()
+            if full:
+                # Обратное давление: сбрасываем буфер в потоке запроса
+                self.flush()
+                with self._lock:
+                    self._queue.append(event)
+                    self.counters['enqueued'] += 1
+                    accepted += 1
+        if dropped:
+            logger.warning(
+                'Буфер аналитики переполнен, отброшено %s событий: %s', dropped, self.stats()
+            )
+        elif blocked:
+            logger.warning(
+                'Буфер аналитики переполнен, запрос ждал записи %s раз: %s', blocked, self.stats()
+            )
+        return accepted
+
+    def flush(self):
+        """Записывает накопленные события, возвращает их число"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._queue)
+                self._queue.clear()
+            if not batch:
+                return 0
+            try:
+                write_events(batch)
+            except Exception:
+                logger.exception('Не удалось записать %s событий аналитики', len(batch))
+                with self._lock:
+                    self.counters['failed'] += len(batch)
+                return 0
+            with self._lock:
+                self.counters['written'] += len(batch)
+                self.counters['flushes'] += 1
+            return len(batch)
+
+    def stop(self):
+        """Останавливает фоновый поток и сбрасывает остаток"""
+        with self._lock:
+            already_stopped = self._stopped
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        if not self.flush() and already_stopped:
+            return
+        stats = self.stats()
+        # Потери событий видны в логе и без настроенного уровня INFO
+        level = logging.WARNING if stats['dropped'] or stats['failed'] else logging.INFO
+        logger.log(level, 'Буфер аналитики остановлен: %s', stats)
+
+    def stats(self):
+        """Счётчики буфера и число ещё не записанных событий"""
+        with self._lock:
+            return dict(self.counters, pending=len(self._queue))
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='analytics-buffer', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            with self._lock:
+                while not self._stopped and len(self._queue) < self.flush_events:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                if self._stopped:
+                    return
+            self.flush()
+            close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Буфер текущего процесса, создаётся по настройкам ANALYTICS_BUFFER"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = settings.ANALYTICS_BUFFER
+                _buffer = AnalyticsBuffer(
+                    max_events=options['MAX_EVENTS'],
+                    flush_events=options['FLUSH_EVENTS'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    overflow=options['OVERFLOW'],
+                )
+    return _buffer
+
+
+def record_events(events):
+    """Записывает события через буфер или синхронно, если буфер выключен.
+
+    Возвращает True, если события поставлены в очередь.
+    """
+    if settings.ANALYTICS_BUFFER['ENABLED']:
+        get_buffer().enqueue(events)
+        return True
+    write_events(events)
+    return False
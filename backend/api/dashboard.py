@@ -0,0 +1,213 @@
+"""Статистика дашборда аналитики"""
+import logging
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .hll import standard_error
+from .models import Tenant, Menu, Category, Item, AnalyticsEvent
+from .public_menu import menu_etag
+from .rollups import (
+    get_cursor_position, event_totals, top_item_counts,
+    approximate_unique_sessions, exact_unique_sessions,
+)
+from .serializers import DashboardStatsSerializer
+from .utils import LazyExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+PERIOD_DAYS = {
+    '7d': 7,
+    '30d': 30,
+    '90d': 90,
+}
+
+VIEW_TYPES = ['view_category', 'open_item']
+PLAY_TYPES = ['play_preview', 'play_full']
+INTERACTION_TYPES = ['open_item', 'play_preview', 'play_full']
+
+
+class PeriodError(ValueError):
+    pass
+
+
+def _parse_moment(value, end_of_day=False):
+    try:
+        # Дату без времени проверяем первой: parse_datetime принимает её как полночь
+        day = parse_date(value)
+        if day is not None:
+            # Дата без времени: весь день включительно
+            moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+        else:
+            moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise PeriodError(f'Некорректная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def resolve_period(params):
+    """Окно [start, end) по параметрам запроса: period=7d|30d|90d или from/to"""
+    now = timezone.now()
+    if params.get('from') or params.get('to'):
+        start = _parse_moment(params['from']) if params.get('from') else now - timedelta(days=7)
+        end = _parse_moment(params['to'], end_of_day=True) if params.get('to') else now
+        end = min(end, now)
+        if start >= end:
+            raise PeriodError('Начало периода должно быть раньше конца')
+        return start, end
+    days = PERIOD_DAYS.get(params.get('period', '7d'), 7)
+    return now - timedelta(days=days), now
+
+
+def tree_counts(tenant):
+    """Число меню, категорий и блюд тенанта.
+
+    Счётчики кэшируются под версией меню тенанта и пересчитываются только
+    после изменения дерева меню.
+    """
+    key = f'tree_counts:{tenant.pk}:{menu_etag(tenant)}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = {
+            'total_menus': Menu.objects.filter(tenant=tenant).count(),
+            'total_categories': Category.objects.filter(tenant=tenant).count(),
+            'total_items': Item.objects.filter(tenant=tenant).count(),
+        }
+        cache.set(key, counts, 60 * 60 * 24)
+    return counts
+
+
+def compute_stats(tenant, start, end, exact=False):
+    """Данные для DashboardStatsSerializer за окно [start, end)"""
+    cursor_position = get_cursor_position()
+
+    # Просмотры и воспроизведения: агрегаты плюс ещё не агрегированный хвост
+    # одним запросом с условными агрегатами
+    totals = event_totals(
+        tenant, start, end, {'views': VIEW_TYPES, 'plays': PLAY_TYPES}, cursor_position
+    )
+
+    # Уникальные сессии: по умолчанию оценка по HyperLogLog-скетчам,
+    # exact=true — точный подсчёт по сырым событиям для сверки
+    if exact:
+        unique_users = exact_unique_sessions(tenant, start, end)
+    else:
+        unique_users = approximate_unique_sessions(tenant, start, end, cursor_position)
+
+    # Последняя активность
+    recent_activity = AnalyticsEvent.objects.filter(
+        tenant=tenant,
+        timestamp__gte=start,
+        timestamp__lt=end,
+    ).order_by('-timestamp')[:10]
+
+    # Топ блюда
+    top_counts = top_item_counts(tenant, start, end, INTERACTION_TYPES, 5, cursor_position)
+    items_by_id = Item.objects.with_related().filter(tenant=tenant).in_bulk(
+        [item_id for item_id, _ in top_counts]
+    )
+    top_items = []
+    for item_id, interactions_count in top_counts:
+        item = items_by_id.get(item_id)
+        if item is not None:
+            item.interactions_count = interactions_count
+            top_items.append(item)
+
+    return {
+        **tree_counts(tenant),
+        'period_start': start,
+        'period_end': end,
+        'total_views': totals['views'],
+        'total_plays': totals['plays'],
+        'unique_users': unique_users,
+        'unique_users_exact': exact,
+        'unique_users_error': 0.0 if exact else standard_error(),
+        'recent_activity': list(recent_activity),
+        'top_items': top_items,
+    }
+
+
+def build_stats_payload(tenant, params):
+    """Сериализованная статистика по параметрам запроса"""
+    start, end = resolve_period(params)
+    exact = params.get('exact') == 'true'
+    return DashboardStatsSerializer(compute_stats(tenant, start, end, exact=exact)).data
+
+
+# Кэш статистики: свежие данные отдаются как есть, устаревшие отдаются сразу
+# и пересчитываются в фоне; одновременно для тенанта и периода выполняется
+# не больше одного пересчёта (блокировка через cache.add)
+
+_refresh_executor = LazyExecutor(lambda: ThreadPoolExecutor(
+    max_workers=settings.ANALYTICS_STATS_CACHE['REFRESH_WORKERS'],
+    thread_name_prefix='stats-refresh',
+))
+
+
+def _stats_cache_key(tenant_id, params):
+    period = '|'.join(params.get(name, '') for name in ('period', 'from', 'to'))
+    return f'dashboard_stats:{tenant_id}:{period}'
+
+
+def _recompute(key, tenant, params):
+    options = settings.ANALYTICS_STATS_CACHE
+    try:
+        payload = build_stats_payload(tenant, params)
+        cache.set(key, {'data': payload, 'computed_at': time_module.time()}, options['STALE_SECONDS'])
+        return payload
+    finally:
+        cache.delete(f'{key}:lock')
+
+
+def _refresh_in_background(key, tenant_id, params):
+    try:
+        # Тенант перечитываем: версия меню могла измениться
+        tenant = Tenant.objects.get(pk=tenant_id)
+        _recompute(key, tenant, params)
+    except Exception:
+        logger.exception('Не удалось обновить статистику дашборда %s', key)
+    finally:
+        close_old_connections()
+
+
+def get_cached_stats(tenant, params):
+    """Статистика с кэшированием stale-while-revalidate и single-flight"""
+    options = settings.ANALYTICS_STATS_CACHE
+    params = {name: params.get(name, '') for name in ('period', 'from', 'to', 'exact')}
+    if params['period'] not in PERIOD_DAYS:
+        params['period'] = '7d'
+    # Точный подсчёт для сверки всегда считается заново
+    if params['exact'] == 'true' or not options['FRESH_SECONDS']:
+        return build_stats_payload(tenant, params)
+
+    key = _stats_cache_key(tenant.pk, params)
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        age = time_module.time() - entry['computed_at']
+        if age >= options['FRESH_SECONDS'] and cache.add(lock_key, 1, options['LOCK_SECONDS']):
+            _refresh_executor.submit(_refresh_in_background, key, tenant.pk, dict(params))
+        return entry['data']
+
+    # Промах: считает только тот, кто взял блокировку, остальные ждут результат
+    if cache.add(lock_key, 1, options['LOCK_SECONDS']):
+        return _recompute(key, tenant, params)
+    deadline = time_module.monotonic() + options['LOCK_SECONDS']
+    while time_module.monotonic() < deadline:
+        time_module.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['data']
+    return build_stats_payload(tenant, params)
@@ -0,0 +1,136 @@
+"""Упаковка видео в HLS с несколькими битрейтами.
+
+Результат складывается в MEDIA_ROOT/hls/<sha256 исходника>/: по каталогу на
+рендишен и общий master.m3u8. Для уже упакованного исходника ffmpeg
+повторно не запускается.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from .media import file_etag, file_sha256, local_media_path, media_file_url, probe_media_file
+from .models import MediaAsset
+
+
+HLS_DIR = 'hls'
+MASTER_PLAYLIST = 'master.m3u8'
+
+
+def ffmpeg_binary():
+    """Путь к ffmpeg; RuntimeError, если он не установлен"""
+    ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+    if ffmpeg is None:
+        raise RuntimeError(f'{settings.FFMPEG_BINARY} не найден')
+    return ffmpeg
+
+
+def ladder_for(source_height):
+    """Рендишены лестницы не выше исходного видео (без увеличения)"""
+    ladder = settings.HLS_LADDER
+    if not source_height:
+        return ladder[:1]
+    return [rung for rung in ladder if rung['height'] <= source_height] or ladder[:1]
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def _encode_rendition(ffmpeg, source_path, target_dir, rung):
+    segment = settings.HLS_SEGMENT_SECONDS
+    target_dir.mkdir(parents=True)
+    video_bitrate = rung['video_bitrate']
+    subprocess.run([
+        ffmpeg, '-v', 'error', '-y', '-i', str(source_path),
+        '-vf', f'scale=-2:{rung["height"]}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+        '-b:v', f'{video_bitrate}k', '-maxrate', f'{int(video_bitrate * 1.07)}k',
+        '-bufsize', f'{video_bitrate * 2}k',
+        # Ключевой кадр на границе каждого сегмента
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment})', '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', f'{rung["audio_bitrate"]}k', '-ac', '2',
+        '-f', 'hls', '-hls_time', str(segment), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', str(target_dir / 'segment_%05d.ts'),
+        str(target_dir / 'index.m3u8'),
+    ], check=True, capture_output=True, timeout=60 * 60)
+
+
+def master_playlist(ladder, source_width, source_height):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rung in ladder:
+        bandwidth = (rung['video_bitrate'] + rung['audio_bitrate']) * 1000
+        attributes = f'BANDWIDTH={bandwidth}'
+        if source_width and source_height:
+            width = _even(source_width * min(rung['height'], source_height) / source_height)
+            attributes += f',RESOLUTION={width}x{min(rung["height"], source_height)}'
+        lines.append(f'#EXT-X-STREAM-INF:{attributes}')
+        lines.append(f'{rung["name"]}/index.m3u8')
+    return '\n'.join(lines) + '\n'
+
+
+def package_hls(source_path, source_hash):
+    """Собирает HLS для файла, если его ещё нет; возвращает путь master.m3u8 относительно MEDIA_ROOT"""
+    relative = f'{HLS_DIR}/{source_hash}/{MASTER_PLAYLIST}'
+    target = Path(settings.MEDIA_ROOT) / HLS_DIR / source_hash
+    if (target / MASTER_PLAYLIST).exists():
+        return relative
+
+    ffmpeg = ffmpeg_binary()
+    metadata = probe_media_file(source_path, 'video')
+    ladder = ladder_for(metadata.get('height'))
+
+    # Собираем во временном каталоге и переименовываем целиком, чтобы
+    # плееры не увидели недописанный плейлист
+    target.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(dir=target.parent, prefix=f'.{source_hash}.'))
+    try:
+        for rung in ladder:
+            _encode_rendition(ffmpeg, source_path, work_dir / rung['name'], rung)
+        (work_dir / MASTER_PLAYLIST).write_text(
+            master_playlist(ladder, metadata.get('width'), metadata.get('height'))
+        )
+        try:
+            work_dir.rename(target)
+        except OSError:
+            # Тот же исходник уже упаковал другой воркер
+            if not (target / MASTER_PLAYLIST).exists():
+                raise
+    finally:
+        if work_dir.exists():
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return relative
+
+
+def package_asset(asset):
+    """Упаковывает видео ассета и записывает hls_url.
+
+    Возвращает 'packaged', 'unchanged' (исходник не менялся) или 'skipped'
+    (файла нет в MEDIA_ROOT).
+    """
+    source_path = local_media_path(asset.original_url)
+    if asset.type != 'video' or source_path is None:
+        return 'skipped'
+    source_stat = file_etag(os.stat(source_path))
+    if asset.content_hash and source_path.stem == asset.content_hash:
+        # Загрузки лежат под хешем содержимого и не меняются
+        source_hash = asset.content_hash
+    elif asset.hls_url and asset.hls_source_hash and asset.hls_source_stat == source_stat:
+        return 'unchanged'
+    else:
+        source_hash = file_sha256(source_path)
+
+    if asset.hls_url and asset.hls_source_hash == source_hash:
+        if asset.hls_source_stat != source_stat:
+            asset.hls_source_stat = source_stat
+            MediaAsset.objects.filter(pk=asset.pk).update(hls_source_stat=source_stat)
+        return 'unchanged'
+
+    asset.hls_url = media_file_url(package_hls(source_path, source_hash))
+    asset.hls_source_hash = source_hash
+    asset.hls_source_stat = source_stat
+    asset.save(update_fields=['hls_url', 'hls_source_hash', 'hls_source_stat', 'updated_at'])
+    return 'packaged'
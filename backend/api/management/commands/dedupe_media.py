@@ -0,0 +1,107 @@
+import time
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from api.models import MediaAsset, ItemMedia
+from api.media import file_sha256, local_media_path
+from api.public_menu import bump_menu_version
+
+
+# Поля, которые переносятся с дубликата, если у оставшегося ассета они пустые
+MERGED_FIELDS = [
+    'hls_url', 'hls_source_hash', 'poster_url', 'thumbnail_url', 'file_size',
+    'duration_seconds', 'width', 'height', 'image_variants_json',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge duplicate media assets within each tenant: local files by content hash, '
+        'external ones by identical URL. Item media are repointed to the surviving asset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Only process assets of the tenant with this slug')
+        parser.add_argument('--dry-run', action='store_true', help='Only report duplicate groups')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        assets = MediaAsset.objects.order_by('id')
+        if options.get('tenant'):
+            assets = assets.filter(tenant__slug=options['tenant'])
+
+        groups = defaultdict(list)
+        hashes = {}
+        hashed = 0
+        for asset in assets.iterator():
+            content_hash = asset.content_hash
+            if not content_hash:
+                path = local_media_path(asset.original_url)
+                if path is not None:
+                    content_hash = hashes[asset.pk] = file_sha256(path)
+                    hashed += 1
+            key = f'sha256:{content_hash}' if content_hash else f'url:{asset.type}:{asset.original_url}'
+            groups[(asset.tenant_id, key)].append(asset)
+
+        merged = 0
+        tenants = set()
+        for (tenant_id, key), group in groups.items():
+            if len(group) > 1:
+                merged += len(group) - 1
+                if options['dry_run']:
+                    self.stdout.write(f'Tenant {tenant_id}: {len(group)} assets share {key}')
+                else:
+                    self.merge(group)
+                    tenants.add(tenant_id)
+
+        if not options['dry_run']:
+            # Хеши оставшихся локальных ассетов записываем после слияния,
+            # чтобы не нарушить уникальность (tenant, content_hash)
+            to_update = []
+            for group in groups.values():
+                survivor = group[0]
+                if survivor.pk in hashes and not survivor.content_hash:
+                    survivor.content_hash = hashes[survivor.pk]
+                    to_update.append(survivor)
+            MediaAsset.objects.bulk_update(to_update, ['content_hash'], batch_size=500)
+
+        for tenant_id in tenants:
+            bump_menu_version(tenant_id)
+
+        elapsed = time.monotonic() - started
+        action = 'Would merge' if options['dry_run'] else 'Merged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {merged} duplicate assets, hashed {hashed} local files in {elapsed:.1f}s'
+        ))
+
+    @staticmethod
+    def merge(group):
+        """Оставляет ассет с готовыми производными (или самый старый), остальные удаляет"""
+        group.sort(key=lambda asset: (not asset.hls_url, not asset.image_variants_json, asset.pk))
+        survivor, duplicates = group[0], group[1:]
+        for duplicate in duplicates:
+            for field in MERGED_FIELDS:
+                if not getattr(survivor, field) and getattr(duplicate, field):
+                    setattr(survivor, field, getattr(duplicate, field))
+
+        with transaction.atomic():
+            ItemMedia.objects.filter(media__in=duplicates).update(media=survivor)
+            # После переноса у блюда могли оказаться две одинаковые связи
+            repeated = (
+                ItemMedia.objects.filter(media=survivor)
+                .values('item_id', 'kind')
+                .annotate(keep_id=Min('id'), links=Count('id'))
+                .filter(links__gt=1)
+            )
+            for row in repeated:
+                ItemMedia.objects.filter(
+                    media=survivor, item_id=row['item_id'], kind=row['kind']
+                ).exclude(id=row['keep_id']).delete()
+            MediaAsset.objects.filter(id__in=[duplicate.pk for duplicate in duplicates]).delete()
+            survivor.save(update_fields=MERGED_FIELDS + ['updated_at'])
+        # Ссылка в группе остаётся на оставшемся ассете для записи хеша
+        group[:] = [survivor]
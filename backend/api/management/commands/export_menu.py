@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Menu
+from api.menu_io import export_menu_csv, export_menu_json, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Export a menu in the import format (JSON or CSV) to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('menu_id', type=int, help='Menu id')
+        parser.add_argument('--format', dest='fmt', choices=list(FORMATS), default='json', help='Output format')
+        parser.add_argument('--output', type=str, help='Output file (stdout by default)')
+
+    def handle(self, *args, **options):
+        menu = Menu.objects.filter(pk=options['menu_id']).first()
+        if menu is None:
+            raise CommandError(f'Menu {options["menu_id"]} does not exist')
+
+        chunks = export_menu_csv(menu) if options['fmt'] == 'csv' else export_menu_json(menu)
+        if options.get('output'):
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
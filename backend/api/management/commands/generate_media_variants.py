@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import MediaAsset
+from api.media import update_asset_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG width variants for posters and images stored under MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Only process assets of the tenant with this slug')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        assets = MediaAsset.objects.order_by('id')
+        if options.get('tenant'):
+            assets = assets.filter(tenant__slug=options['tenant'])
+
+        processed = skipped = failed = 0
+        for asset in assets.iterator():
+            try:
+                if update_asset_variants(asset):
+                    processed += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Asset {asset.pk}: {e}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} assets, skipped {skipped} without local images, '
+            f'failed {failed} in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Menu
+from api.menu_io import import_menu, parse_import, MenuImportError, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Import categories, items, prices and media into a menu from a JSON or CSV file in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('menu_id', type=int, help='Target menu id')
+        parser.add_argument('path', type=str, help='JSON or CSV file')
+        parser.add_argument('--format', dest='fmt', choices=list(FORMATS), help='File format (by extension by default)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        menu = Menu.objects.select_related('tenant').filter(pk=options['menu_id']).first()
+        if menu is None:
+            raise CommandError(f'Menu {options["menu_id"]} does not exist')
+        path = Path(options['path'])
+        fmt = options.get('fmt') or path.suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError('Use --format json or --format csv')
+
+        try:
+            categories = parse_import(path.read_bytes(), fmt)
+        except MenuImportError as e:
+            raise CommandError(f'{e}: {e.errors}')
+        stats = import_menu(menu, categories, partial=fmt == 'csv')
+
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{key} {value}' for key, value in sorted(stats.items()))
+        self.stdout.write(self.style.SUCCESS(f'Imported into menu {menu.pk} in {elapsed:.1f}s: {summary}'))
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.models import MediaAsset
+from api.hls import ffmpeg_binary, package_asset
+
+
+class Command(BaseCommand):
+    help = (
+        'Package local video assets into multi-bitrate HLS under MEDIA_ROOT/hls and set hls_url; '
+        'assets whose source file hash has not changed are skipped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Concurrent ffmpeg jobs (HLS_WORKERS by default)')
+        parser.add_argument('--tenant', type=str, help='Only process assets of the tenant with this slug')
+        parser.add_argument('--watch', action='store_true', help='Keep running and pick up new or changed videos')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between scans in --watch mode')
+
+    def handle(self, *args, **options):
+        try:
+            ffmpeg_binary()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        workers = options.get('workers') or settings.HLS_WORKERS
+        if workers < 1:
+            raise CommandError('--workers must be positive')
+
+        self.jobs = queue.Queue()
+        self.results = Counter()
+        self.results_lock = threading.Lock()
+        self.in_flight = set()
+        threads = [
+            threading.Thread(target=self.worker, name=f'hls-{n}', daemon=True)
+            for n in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        started = time.monotonic()
+        try:
+            while True:
+                self.enqueue(options.get('tenant'))
+                if not options['watch']:
+                    break
+                time.sleep(options['interval'])
+            self.jobs.join()
+        except KeyboardInterrupt:
+            self.stderr.write('Interrupted, waiting for running jobs')
+        finally:
+            for _ in threads:
+                self.jobs.put(None)
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Packaged {self.results["packaged"]} videos, unchanged {self.results["unchanged"]}, '
+            f'skipped {self.results["skipped"]} without local files, failed {self.results["failed"]} '
+            f'in {elapsed:.1f}s'
+        ))
+
+    def enqueue(self, tenant_slug):
+        assets = MediaAsset.objects.filter(type='video').order_by('id')
+        if tenant_slug:
+            assets = assets.filter(tenant__slug=tenant_slug)
+        for asset_id in assets.values_list('id', flat=True):
+            with self.results_lock:
+                if asset_id in self.in_flight:
+                    continue
+                self.in_flight.add(asset_id)
+            self.jobs.put(asset_id)
+
+    def worker(self):
+        while True:
+            asset_id = self.jobs.get()
+            if asset_id is None:
+                self.jobs.task_done()
+                return
+            try:
+                asset = MediaAsset.objects.filter(pk=asset_id).first()
+                result = package_asset(asset) if asset is not None else 'skipped'
+                if result == 'packaged':
+                    self.stdout.write(f'Asset {asset_id}: {asset.hls_url}')
+            except Exception as e:
+                result = 'failed'
+                self.stderr.write(f'Asset {asset_id}: {e}')
+            finally:
+                close_old_connections()
+                with self.results_lock:
+                    self.results[result] += 1
+                    self.in_flight.discard(asset_id)
+                self.jobs.task_done()
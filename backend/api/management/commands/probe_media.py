@@ -0,0 +1,78 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.models import MediaAsset
+from api.media import missing_metadata_q, probe_asset
+from api.public_menu import bump_menu_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill file_size, width, height and duration_seconds of media assets stored under '
+        'MEDIA_ROOT; only assets missing the metadata of their type are probed, so the command can be re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Parallel probe threads')
+        parser.add_argument('--batch-size', type=int, default=200, help='Assets per bulk update')
+        parser.add_argument('--tenant', type=str, help='Only process assets of the tenant with this slug')
+        parser.add_argument('--all', action='store_true', help='Re-probe assets that already have metadata')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        assets = MediaAsset.objects.order_by('id')
+        if options.get('tenant'):
+            assets = assets.filter(tenant__slug=options['tenant'])
+        if not options['all']:
+            assets = assets.filter(missing_metadata_q())
+
+        probed = updated = failed = 0
+        total_bytes = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(assets.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                changed = []
+                changed_fields = set()
+                for asset, result in zip(batch, executor.map(self.probe, batch)):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        self.stderr.write(f'Asset {asset.pk}: {result}')
+                        continue
+                    if result is None:
+                        continue
+                    probed += 1
+                    total_bytes += result.get('file_size') or asset.file_size or 0
+                    if result:
+                        for field, value in result.items():
+                            setattr(asset, field, value)
+                        changed.append(asset)
+                        changed_fields.update(result)
+
+                if changed:
+                    MediaAsset.objects.bulk_update(changed, sorted(changed_fields))
+                    # bulk_update не вызывает сигналы: длительность есть в публичном меню
+                    for tenant_id in {asset.tenant_id for asset in changed}:
+                        bump_menu_version(tenant_id)
+                    updated += len(changed)
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Probed {probed} local files ({total_bytes / 1024 / 1024:.1f} MB), updated {updated}, '
+            f'failed {failed} in {elapsed:.1f}s: {probed / elapsed:.1f} files/s, '
+            f'{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s'
+        ))
+
+    @staticmethod
+    def probe(asset):
+        try:
+            return probe_asset(asset)
+        except Exception as e:
+            return e
@@ -0,0 +1,109 @@
+import gzip
+import json
+import time
+
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.models import Tenant, AnalyticsEvent
+from api.rollups import rollup_events, get_cursor_position, downsample_hourly_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive raw analytics events older than the retention horizon of the tenant plan '
+        'to compressed NDJSON files and delete them in small chunks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=str, help='Only process the tenant with this slug')
+        parser.add_argument('--days', type=int, help='Override the retention horizon for every plan')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Events per delete transaction')
+        parser.add_argument('--archive-dir', type=str, help='Archive directory (ANALYTICS_ARCHIVE_ROOT by default)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count events that would be archived')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        archive_root = Path(options.get('archive_dir') or settings.ANALYTICS_ARCHIVE_ROOT)
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        # Сначала доводим агрегаты до актуального состояния: удалять можно
+        # только события, уже учтённые в агрегатах
+        if not options['dry_run']:
+            rollup_events()
+            cursor_position = get_cursor_position()
+
+        tenants = Tenant.objects.order_by('id')
+        if options.get('tenant'):
+            tenants = tenants.filter(slug=options['tenant'])
+
+        now = timezone.now()
+        total = 0
+        for tenant in tenants:
+            days = options.get('days') or settings.ANALYTICS_RETENTION_DAYS.get(tenant.plan)
+            if not days:
+                continue
+            events = AnalyticsEvent.objects.filter(
+                tenant=tenant,
+                timestamp__lt=now - timedelta(days=days),
+            )
+
+            if options['dry_run']:
+                count = events.count()
+                self.stdout.write(f'{tenant.slug}: {count} events older than {days} days')
+                total += count
+                continue
+
+            events = events.filter(id__lte=cursor_position)
+            count = self.archive_and_delete(tenant, events, archive_root, now, chunk_size)
+            if count:
+                self.stdout.write(f'{tenant.slug}: archived and deleted {count} events older than {days} days')
+            total += count
+
+        if not options['dry_run']:
+            deleted_rollups = downsample_hourly_rollups()
+            self.stdout.write(f'Deleted {deleted_rollups} hourly rollups covered by daily ones')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} events in {elapsed:.1f}s'))
+
+    def archive_and_delete(self, tenant, events, archive_root, now, chunk_size):
+        """Выгружает события порциями в gzip NDJSON и удаляет каждую порцию отдельно"""
+        path = archive_root / tenant.slug / f'events-{now:%Y%m%dT%H%M%S}.ndjson.gz'
+        archived = 0
+        last_id = 0
+        archive = None
+        try:
+            while True:
+                chunk = list(
+                    events.filter(id__gt=last_id).order_by('id').values(
+                        'id', 'session_id', 'type', 'category_id', 'item_id',
+                        'metadata_json', 'timestamp', 'created_at',
+                    )[:chunk_size]
+                )
+                if not chunk:
+                    break
+
+                if archive is None:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    archive = gzip.open(path, 'at', encoding='utf-8')
+                for event in chunk:
+                    archive.write(json.dumps(event, ensure_ascii=False, default=str))
+                    archive.write('\n')
+                archive.flush()
+
+                # Каждая порция удаляется в своей короткой транзакции,
+                # чтобы не держать блокировку записи
+                last_id = chunk[-1]['id']
+                AnalyticsEvent.objects.filter(id__in=[event['id'] for event in chunk]).delete()
+                archived += len(chunk)
+        finally:
+            if archive is not None:
+                archive.close()
+        return archived
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import UploadSession
+from api.media import upload_session_path
+
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions and their partial files not touched for MEDIA_UPLOAD_SESSION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override MEDIA_UPLOAD_SESSION_DAYS')
+
+    def handle(self, *args, **options):
+        days = options.get('days') or settings.MEDIA_UPLOAD_SESSION_DAYS
+        sessions = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(days=days))
+        freed = 0
+        count = 0
+        for session in sessions.iterator():
+            path = upload_session_path(session)
+            if path.exists():
+                freed += path.stat().st_size
+                path.unlink()
+            count += 1
+        sessions.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {count} upload sessions, freed {freed / 1024 / 1024:.1f} MB'
+        ))
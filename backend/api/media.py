@@ -0,0 +1,389 @@
+"""Локальные медиафайлы: поиск по URL, хеширование, метаданные и производные изображения"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from .utils import LazyExecutor, atomic_write
+
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'variants'
+UPLOADS_DIR = 'uploads'
+
+MEDIA_TYPES = ['image', 'video', 'audio']
+
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,8}$')
+
+BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Поля, которые probe_media_file заполняет для каждого типа медиа
+METADATA_FIELDS = {
+    'image': ['file_size', 'width', 'height'],
+    'video': ['file_size', 'duration_seconds'],
+    'audio': ['file_size', 'duration_seconds'],
+}
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def media_file_url(relative):
+    """Публичный URL файла из MEDIA_ROOT"""
+    return f'{settings.MEDIA_BASE_URL.rstrip("/")}{settings.MEDIA_URL}{relative}'
+
+
+def local_media_path(url):
+    """Путь к файлу в MEDIA_ROOT для URL нашего медиа, иначе None"""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.netloc:
+        base = urlsplit(settings.MEDIA_BASE_URL)
+        host = parts.hostname or ''
+        if parts.netloc != base.netloc and host not in settings.ALLOWED_HOSTS:
+            return None
+    if not parts.path.startswith(settings.MEDIA_URL):
+        return None
+    try:
+        path = Path(safe_join(settings.MEDIA_ROOT, parts.path[len(settings.MEDIA_URL):]))
+    except SuspiciousFileOperation:
+        return None
+    return path if path.is_file() else None
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 файла, читается кусками"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_type_for(content_type):
+    """Тип MediaAsset по MIME-типу файла, None для неподдерживаемых"""
+    main_type = (content_type or '').split('/')[0]
+    return main_type if main_type in MEDIA_TYPES else None
+
+
+def upload_extension(filename):
+    """Расширение имени загруженного файла, если оно безопасно"""
+    extension = Path(filename or '').suffix.lower()
+    return extension if EXTENSION_RE.match(extension) else ''
+
+
+def write_upload(chunks):
+    """Пишет куски файла во временный файл в MEDIA_ROOT/uploads/, по пути считая SHA-256.
+
+    Возвращает (путь, хеш, размер).
+    """
+    upload_dir = Path(settings.MEDIA_ROOT) / UPLOADS_DIR
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in chunks:
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return Path(tmp_path), digest.hexdigest(), size
+
+
+def store_media_file(tenant, temp_path, content_hash, media_type, extension=''):
+    """Ассет тенанта для файла с данным хешем: существующий или новый.
+
+    Повторная загрузка того же содержимого возвращает уже созданный ассет
+    вместе с его постерами, вариантами и HLS, временный файл удаляется.
+    Возвращает (asset, created).
+    """
+    from .models import MediaAsset
+
+    existing = MediaAsset.objects.filter(tenant=tenant, content_hash=content_hash).first()
+    if existing is not None:
+        os.unlink(temp_path)
+        return existing, False
+
+    # Файлы лежат по хешу содержимого: одинаковые загрузки разных тенантов
+    # занимают место на диске один раз
+    relative = f'{UPLOADS_DIR}/{content_hash[:2]}/{content_hash}{extension}'
+    target = Path(settings.MEDIA_ROOT) / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # На одном разделе это переименование без копирования
+    shutil.move(temp_path, target)
+    try:
+        with transaction.atomic():
+            asset = MediaAsset.objects.create(
+                tenant=tenant,
+                type=media_type,
+                original_url=media_file_url(relative),
+                content_hash=content_hash,
+                file_size=target.stat().st_size,
+            )
+    except IntegrityError:
+        # Тот же файл параллельно загрузил другой запрос
+        return MediaAsset.objects.get(tenant=tenant, content_hash=content_hash), False
+    return asset, True
+
+
+def store_upload(tenant, uploaded_file, media_type):
+    """Сохраняет загруженный файл с дедупликацией по хешу; возвращает (asset, created)"""
+    temp_path, content_hash, _ = write_upload(uploaded_file.chunks())
+    return store_media_file(
+        tenant, temp_path, content_hash, media_type, upload_extension(uploaded_file.name)
+    )
+
+
+def generate_image_variants(source_path, widths=None):
+    """Уменьшенные копии изображения в WebP и JPEG по лестнице ширин.
+
+    Копии кэшируются в MEDIA_ROOT/variants/ по хешу исходника, поэтому
+    повторный вызов для того же файла ничего не пересчитывает. Возвращает
+    список {'url', 'width', 'height', 'type'}, отсортированный по ширине.
+    """
+    widths = sorted(widths or settings.IMAGE_VARIANT_WIDTHS)
+    source_hash = file_sha256(source_path)
+    relative_dir = f'{VARIANTS_DIR}/{source_hash[:2]}/{source_hash}'
+    target_dir = Path(settings.MEDIA_ROOT) / relative_dir
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source_path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        source_width, source_height = image.size
+        # Не увеличиваем: ширины больше исходной заменяет сама исходная ширина
+        ladder = [width for width in widths if width < source_width] or [source_width]
+        if source_width <= widths[-1] and source_width not in ladder:
+            ladder.append(source_width)
+
+        variants = []
+        for width in ladder:
+            height = max(1, round(source_height * width / source_width))
+            resized = None
+            for extension, (pil_format, content_type) in VARIANT_FORMATS.items():
+                path = target_dir / f'{width}.{extension}'
+                if not path.exists():
+                    if resized is None:
+                        resized = image.resize((width, height), Image.LANCZOS)
+                    output = resized
+                    if pil_format == 'JPEG' and output.mode != 'RGB':
+                        output = output.convert('RGB')
+                    with atomic_write(path) as tmp:
+                        output.save(tmp, format=pil_format, quality=settings.IMAGE_VARIANT_QUALITY)
+                variants.append({
+                    'url': media_file_url(f'{relative_dir}/{width}.{extension}'),
+                    'width': width,
+                    'height': height,
+                    'type': content_type,
+                })
+    return variants
+
+
+def variant_source_url(asset):
+    """Изображение, из которого строятся варианты: постер видео или сама картинка"""
+    if asset.type == 'image':
+        return asset.original_url
+    return asset.poster_url or asset.thumbnail_url
+
+
+def update_asset_variants(asset):
+    """Строит варианты постера ассета и записывает их в image_variants_json.
+
+    Возвращает True, если у ассета есть локальный исходник.
+    """
+    source_path = local_media_path(variant_source_url(asset))
+    if source_path is None:
+        return False
+    variants = generate_image_variants(source_path)
+    if variants != asset.image_variants_json:
+        asset.image_variants_json = variants
+        asset.save(update_fields=['image_variants_json', 'updated_at'])
+    return True
+
+
+def _ffprobe(path):
+    """Размеры и длительность через ffprobe, если он установлен"""
+    ffprobe = shutil.which(settings.FFPROBE_BINARY)
+    if ffprobe is None:
+        return {}
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', str(path)],
+        capture_output=True, timeout=60, check=True,
+    )
+    info = json.loads(result.stdout or b'{}')
+    metadata = {}
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == 'video' and stream.get('width'):
+            metadata['width'] = stream['width']
+            metadata['height'] = stream['height']
+            break
+    duration = info.get('format', {}).get('duration')
+    if duration:
+        metadata['duration_seconds'] = max(1, round(float(duration)))
+    return metadata
+
+
+def missing_metadata_q():
+    """Условие на ассеты, у которых не заполнены метаданные их типа.
+
+    Без ffprobe длительность видео и аудио получить нельзя, поэтому для них
+    ожидается только file_size — иначе каждый запуск заново проверял бы их все.
+    """
+    ffprobe_available = shutil.which(settings.FFPROBE_BINARY) is not None
+    missing = Q()
+    for media_type, fields in METADATA_FIELDS.items():
+        if media_type != 'image' and not ffprobe_available:
+            fields = ['file_size']
+        empty = Q()
+        for field in fields:
+            empty |= Q(**{f'{field}__isnull': True})
+        missing |= Q(type=media_type) & empty
+    return missing
+
+
+def probe_media_file(path, media_type):
+    """Метаданные локального файла: file_size, width, height, duration_seconds"""
+    metadata = {'file_size': os.stat(path).st_size}
+    if media_type == 'image':
+        with Image.open(path) as image:
+            metadata['width'], metadata['height'] = image.size
+    else:
+        metadata.update(_ffprobe(path))
+    return metadata
+
+
+def probe_asset(asset):
+    """Метаданные, которых не хватает ассету; None, если файла нет локально"""
+    path = local_media_path(asset.original_url)
+    if path is None:
+        return None
+    metadata = probe_media_file(path, asset.type)
+    return {field: value for field, value in metadata.items() if getattr(asset, field) != value}
+
+
+_probe_executor = LazyExecutor(lambda: ThreadPoolExecutor(
+    max_workers=settings.MEDIA_PROBE_WORKERS, thread_name_prefix='media-probe'
+))
+
+
+def _probe_in_background(asset_id):
+    from .models import MediaAsset
+    from .public_menu import bump_menu_version
+
+    try:
+        asset = MediaAsset.objects.filter(pk=asset_id).first()
+        if asset is None:
+            return
+        changes = probe_asset(asset)
+        if changes:
+            MediaAsset.objects.filter(pk=asset_id).update(**changes)
+            bump_menu_version(asset.tenant_id)
+    except Exception:
+        logger.exception('Не удалось получить метаданные медиа %s', asset_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_probe(asset):
+    """Определяет метаданные нового ассета в фоне, вне обработки запроса"""
+    if local_media_path(asset.original_url) is not None:
+        _probe_executor.submit(_probe_in_background, asset.pk)
+
+
+def file_etag(stat_result):
+    """Сильный ETag файла по inode, размеру и времени изменения"""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_byte_range(header, size):
+    """Диапазон (start, end) включительно из заголовка Range.
+
+    None — заголовка нет или он не поддерживается (несколько диапазонов,
+    другие единицы), тогда отдаётся весь файл. ValueError — диапазон
+    не пересекается с файлом (416).
+    """
+    match = BYTE_RANGE_RE.match(header or '')
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # bytes=-N: последние N байт
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or start > end:
+        raise ValueError('Диапазон за пределами файла')
+    return start, end
+
+
+class RangeFile:
+    """Файл, из которого читается не больше length байт начиная с offset"""
+
+    def __init__(self, file, offset, length):
+        file.seek(offset)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def upload_session_path(session):
+    """Файл, в который пишутся части загрузки"""
+    return Path(settings.UPLOAD_SESSION_ROOT) / f'{session.pk}.part'
+
+
+def write_upload_chunk(session, offset, stream, chunk_size=1024 * 1024):
+    """Пишет тело запроса в файл загрузки начиная с offset, не держа его в памяти.
+
+    Возвращает число записанных байт; при обрыве соединения записанное
+    сохраняется и загрузку можно продолжить с нового смещения.
+    """
+    path = upload_session_path(session)
+    limit = min(session.size - offset, settings.MEDIA_UPLOAD_CHUNK_BYTES)
+    written = 0
+    with open(path, 'r+b') as target:
+        target.seek(offset)
+        try:
+            while written < limit:
+                data = stream.read(min(chunk_size, limit - written))
+                if not data:
+                    break
+                target.write(data)
+                written += len(data)
+        except OSError:
+            logger.warning('Обрыв загрузки %s на %s байтах', session.pk, offset + written)
+    return written
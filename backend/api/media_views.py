@@ -0,0 +1,76 @@
+"""Отдача файлов из MEDIA_ROOT с поддержкой Range и условных запросов"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_http_methods
+
+from .media import file_etag, parse_byte_range, RangeFile
+
+
+def _media_file_response(request, path, full_path, size, content_type, etag, last_modified):
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # Отдачу файла и диапазонов берёт на себя nginx
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    # If-Range: диапазон отдаём, только если у клиента та же версия файла
+    if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+        try:
+            byte_range = parse_byte_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=206 if byte_range else 200)
+    elif byte_range is None:
+        # Целиком: WSGI-сервер может отдать файл через os.sendfile
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        response = FileResponse(
+            RangeFile(open(full_path, 'rb'), start, length), status=206, content_type=content_type
+        )
+    if byte_range:
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.headers['Content-Length'] = length
+    return response
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """Файлы из MEDIA_ROOT с поддержкой Range, If-Range и условных запросов"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _media_file_response(request, path, full_path, size, content_type, etag, last_modified)
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
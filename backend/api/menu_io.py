@@ -0,0 +1,372 @@
+"""Импорт и экспорт дерева меню в JSON и CSV.
+
+Формат JSON:
+    {"categories": [{"name", "sort", "items": [{"sku", "name", "description",
+    "tags", "allergens", "nutrition", "weight_g", "kcal", "sort",
+    "prices": [{"amount_minor", "currency"}],
+    "media": [{"kind", "type", "url", "poster_url", "sort"}]}]}]}
+
+CSV — одна строка на блюдо, колонки CSV_COLUMNS; теги и аллергены через
+«|», у блюда одна цена и до двух видео (preview_url, full_url). CSV описывает
+блюдо не полностью, поэтому при его импорте цены в других валютах и медиа
+других видов (CSV_MEDIA_KINDS) не трогаются.
+
+Категории сопоставляются по имени внутри меню, блюда — по sku, а без sku —
+по категории и имени. Импорт идёт одной транзакцией пачками bulk_create /
+bulk_update и повышает версию меню один раз.
+"""
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, Item, Price, MediaAsset, ItemMedia
+from .public_menu import single_menu_bump
+from .serializers import MenuImportSerializer
+
+
+FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = [
+    'category', 'category_sort', 'sku', 'name', 'description', 'tags', 'allergens',
+    'weight_g', 'kcal', 'sort', 'price_minor', 'currency', 'preview_url', 'full_url', 'poster_url',
+]
+
+CSV_MEDIA_COLUMNS = ['preview_url', 'full_url', 'poster_url']
+
+# Виды медиа, у которых в CSV есть колонки
+CSV_MEDIA_KINDS = ['preview', 'full']
+
+LIST_SEPARATOR = '|'
+
+# Поле импорта -> поле Item
+ITEM_FIELDS = {
+    'sku': 'sku',
+    'name': 'name',
+    'description': 'description',
+    'tags': 'tags',
+    'allergens': 'allergens',
+    'nutrition': 'nutrition_values_json',
+    'weight_g': 'weight_g',
+    'kcal': 'kcal',
+    'sort': 'sort',
+}
+
+BULK_BATCH_SIZE = 500
+
+
+class MenuImportError(ValueError):
+    """Файл импорта не прошёл проверку; errors — подробности по полям"""
+
+    def __init__(self, errors):
+        super().__init__('Некорректные данные импорта')
+        self.errors = errors
+
+
+def _split(value):
+    return [part.strip() for part in value.split(LIST_SEPARATOR) if part.strip()]
+
+
+def parse_csv(text):
+    """Строки CSV в структуру формата JSON"""
+    reader = csv.DictReader(io.StringIO(text))
+    columns = set(reader.fieldnames or [])
+    with_media = bool(columns & set(CSV_MEDIA_COLUMNS))
+    categories = {}
+    for row in reader:
+        row = {key: (value or '').strip() for key, value in row.items() if key}
+        category = categories.setdefault(row.get('category', ''), {
+            'name': row.get('category', ''),
+            'items': [],
+        })
+        if row.get('category_sort'):
+            category['sort'] = row['category_sort']
+
+        item = {}
+        for field in ('sku', 'name', 'description'):
+            if field in columns:
+                item[field] = row[field]
+        for field in ('tags', 'allergens'):
+            if field in columns:
+                item[field] = _split(row[field])
+        for field in ('weight_g', 'kcal', 'sort'):
+            if field in columns and (row[field] or field != 'sort'):
+                item[field] = row[field] or None
+        if row.get('price_minor'):
+            price = {'amount_minor': row['price_minor']}
+            if row.get('currency'):
+                price['currency'] = row['currency']
+            item['prices'] = [price]
+        if with_media:
+            item['media'] = [
+                {'kind': kind, 'type': 'video', 'url': row[column], 'poster_url': row.get('poster_url', '')}
+                for kind, column in (('preview', 'preview_url'), ('full', 'full_url'))
+                if row.get(column)
+            ]
+        category['items'].append(item)
+    return {'categories': list(categories.values())}
+
+
+def parse_import(content, fmt):
+    """Проверенные данные импорта из байтов или строки файла"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if fmt == 'csv':
+        data = parse_csv(content)
+    else:
+        try:
+            data = json.loads(content) if isinstance(content, str) else content
+        except ValueError as e:
+            raise MenuImportError({'file': f'Некорректный JSON: {e}'})
+    serializer = MenuImportSerializer(data=data)
+    if not serializer.is_valid():
+        raise MenuImportError(serializer.errors)
+    return serializer.validated_data['categories']
+
+
+def import_menu(menu, categories, partial=False):
+    """Загружает проверенные категории в меню; возвращает счётчики изменений.
+
+    partial — данные из CSV: цены обновляются только в указанных валютах,
+    медиа — только видов CSV_MEDIA_KINDS.
+    """
+    stats = Counter()
+    now = timezone.now()
+    tenant = menu.tenant
+    with transaction.atomic(), single_menu_bump(tenant.pk):
+        # Категории
+        categories_by_name = {category.name: category for category in menu.categories.all()}
+        new_categories, changed_categories = [], {}
+        for position, data in enumerate(categories):
+            sort = data.get('sort', position)
+            category = categories_by_name.get(data['name'])
+            if category is None:
+                category = Category(tenant=tenant, menu=menu, name=data['name'], sort=sort)
+                categories_by_name[data['name']] = category
+                new_categories.append(category)
+            elif category.sort != sort:
+                category.sort = sort
+                if category.pk is not None:
+                    category.updated_at = now
+                    changed_categories[category.pk] = category
+        Category.objects.bulk_create(new_categories, batch_size=BULK_BATCH_SIZE)
+        Category.objects.bulk_update(
+            list(changed_categories.values()), ['sort', 'updated_at'], batch_size=BULK_BATCH_SIZE
+        )
+        stats['categories_created'] = len(new_categories)
+        stats['categories_updated'] = len(changed_categories)
+
+        # Блюда
+        existing_items = list(Item.objects.filter(category__menu=menu))
+        items_by_sku = {item.sku: item for item in existing_items if item.sku}
+        items_by_name = {(item.category_id, item.name): item for item in existing_items}
+        new_items, changed_items, imported = [], {}, []
+        for data in categories:
+            category = categories_by_name[data['name']]
+            for position, item_data in enumerate(data['items']):
+                sku = item_data.get('sku', '')
+                item = items_by_sku.get(sku) if sku else None
+                if item is None:
+                    item = items_by_name.get((category.pk, item_data['name']))
+                if item is None:
+                    item = Item(tenant=tenant, category=category, sort=position)
+                    new_items.append(item)
+                changed = item.category_id != category.pk
+                item.category = category
+                for source, field in ITEM_FIELDS.items():
+                    if source in item_data and getattr(item, field) != item_data[source]:
+                        setattr(item, field, item_data[source])
+                        changed = True
+                if item.pk is not None and changed:
+                    item.updated_at = now
+                    changed_items[item.pk] = item
+                if item.sku:
+                    items_by_sku[item.sku] = item
+                items_by_name[(category.pk, item.name)] = item
+                imported.append((item, item_data))
+        Item.objects.bulk_create(new_items, batch_size=BULK_BATCH_SIZE)
+        Item.objects.bulk_update(
+            list(changed_items.values()),
+            ['category'] + list(ITEM_FIELDS.values()) + ['updated_at'],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        stats['items_created'] = len(new_items)
+        stats['items_updated'] = len(changed_items)
+
+        _import_prices(tenant, imported, stats, now, partial)
+        _import_media(tenant, imported, stats, partial)
+    return dict(stats)
+
+
+def _import_prices(tenant, imported, stats, now, partial=False):
+    """Цены сопоставляются по валюте, лишние удаляются (кроме partial)"""
+    priced = {item.pk: data['prices'] for item, data in imported if 'prices' in data}
+    if not priced:
+        return
+    existing = defaultdict(list)
+    for price in Price.objects.filter(item_id__in=priced.keys()).order_by('id'):
+        existing[(price.item_id, price.currency)].append(price)
+
+    new_prices, changed_prices = [], []
+    for item_id, prices in priced.items():
+        for data in prices:
+            currency = data.get('currency') or tenant.currency
+            matches = existing.get((item_id, currency))
+            if matches:
+                price = matches.pop(0)
+                if price.amount_minor != data['amount_minor']:
+                    price.amount_minor = data['amount_minor']
+                    price.updated_at = now
+                    changed_prices.append(price)
+            else:
+                new_prices.append(Price(item_id=item_id, amount_minor=data['amount_minor'], currency=currency))
+    stale = [] if partial else [price.pk for prices in existing.values() for price in prices]
+
+    Price.objects.bulk_create(new_prices, batch_size=BULK_BATCH_SIZE)
+    Price.objects.bulk_update(changed_prices, ['amount_minor', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+    Price.objects.filter(pk__in=stale).delete()
+    stats['prices_created'] = len(new_prices)
+    stats['prices_updated'] = len(changed_prices)
+    stats['prices_deleted'] = len(stale)
+
+
+def _import_media(tenant, imported, stats, partial=False):
+    """Медиа блюд заменяются целиком; ассеты с тем же URL переиспользуются.
+
+    При partial заменяются только связи видов CSV_MEDIA_KINDS.
+    """
+    with_media = [(item, data['media']) for item, data in imported if 'media' in data]
+    if not with_media:
+        return
+    urls = {media['url'] for _, media_list in with_media for media in media_list}
+    assets = {}
+    for asset in MediaAsset.objects.filter(tenant=tenant, original_url__in=urls).order_by('-id'):
+        assets[asset.original_url] = asset
+    new_assets = []
+    for _, media_list in with_media:
+        for media in media_list:
+            if media['url'] not in assets:
+                assets[media['url']] = MediaAsset(
+                    tenant=tenant,
+                    type=media.get('type', 'video'),
+                    original_url=media['url'],
+                    poster_url=media.get('poster_url', ''),
+                )
+                new_assets.append(assets[media['url']])
+    MediaAsset.objects.bulk_create(new_assets, batch_size=BULK_BATCH_SIZE)
+
+    # Связи пересоздаются только у блюд, у которых набор медиа изменился
+    current = defaultdict(list)
+    links = ItemMedia.objects.filter(item_id__in=[item.pk for item, _ in with_media])
+    if partial:
+        links = links.filter(kind__in=CSV_MEDIA_KINDS)
+    for link in links.order_by('sort', 'id'):
+        current[link.item_id].append(link)
+    links, replaced = [], []
+    for item, media_list in with_media:
+        # Без явного sort связь сохраняет прежнюю позицию
+        sorts = {(link.media_id, link.kind): link.sort for link in current[item.pk]}
+        wanted = [
+            ItemMedia(
+                item=item, media=assets[media['url']], kind=media['kind'],
+                sort=media.get('sort', sorts.get((assets[media['url']].pk, media['kind']), position)),
+            )
+            for position, media in enumerate(media_list)
+        ]
+        if sorted((link.media.pk, link.kind, link.sort) for link in wanted) != sorted(
+            (link.media_id, link.kind, link.sort) for link in current[item.pk]
+        ):
+            replaced.extend(link.pk for link in current[item.pk])
+            links.extend(wanted)
+    stats['media_unlinked'], _ = ItemMedia.objects.filter(pk__in=replaced).delete()
+    ItemMedia.objects.bulk_create(links, batch_size=BULK_BATCH_SIZE)
+    stats['media_created'] = len(new_assets)
+    stats['media_linked'] = len(links)
+
+
+def _export_items(menu):
+    """Пары (категория, блюдо) в порядке меню, блюда читаются порциями"""
+    categories = {category.pk: category for category in menu.categories.all()}
+    items = Item.objects.filter(category__menu=menu).prefetch_related(
+        'prices', 'item_media__media'
+    ).order_by('category__sort', 'category__name', 'category_id', 'sort', 'name', 'id')
+    exported = set()
+    for item in items.iterator(chunk_size=BULK_BATCH_SIZE):
+        exported.add(item.category_id)
+        yield categories[item.category_id], item
+    # Пустые категории тоже выгружаем
+    for category in categories.values():
+        if category.pk not in exported:
+            yield category, None
+
+
+def _item_json(item):
+    data = {source: getattr(item, field) for source, field in ITEM_FIELDS.items()}
+    data['prices'] = [
+        {'amount_minor': price.amount_minor, 'currency': price.currency} for price in item.prices.all()
+    ]
+    data['media'] = [
+        {
+            'kind': link.kind,
+            'type': link.media.type,
+            'url': link.media.original_url,
+            'poster_url': link.media.poster_url,
+            'sort': link.sort,
+        }
+        for link in item.item_media.all()
+    ]
+    return data
+
+
+def export_menu_json(menu):
+    """Генератор JSON меню: категория за категорией"""
+    yield '{"categories": ['
+    current = None
+    for category, item in _export_items(menu):
+        if category is not current:
+            if current is not None:
+                yield ']},'
+            current = category
+            header = json.dumps({'name': category.name, 'sort': category.sort}, ensure_ascii=False)
+            yield header[:-1] + ', "items": ['
+            first = True
+        if item is not None:
+            yield ('' if first else ',') + json.dumps(_item_json(item), ensure_ascii=False)
+            first = False
+    if current is not None:
+        yield ']}'
+    yield ']}\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_menu_csv(menu):
+    """Генератор CSV меню: по строке на блюдо"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for category, item in _export_items(menu):
+        if item is None:
+            continue
+        price = next(iter(item.prices.all()), None)
+        media = {link.kind: link.media for link in item.item_media.all()}
+        poster = next((asset.poster_url for asset in media.values() if asset.poster_url), '')
+        yield writer.writerow([
+            category.name, category.sort, item.sku, item.name, item.description,
+            LIST_SEPARATOR.join(item.tags or []), LIST_SEPARATOR.join(item.allergens or []),
+            '' if item.weight_g is None else item.weight_g,
+            '' if item.kcal is None else item.kcal,
+            item.sort,
+            price.amount_minor if price else '', price.currency if price else '',
+            media['preview'].original_url if 'preview' in media else '',
+            media['full'].original_url if 'full' in media else '',
+            poster,
+        ])
@@ -0,0 +1,195 @@
+"""Массовые операции над деревом меню"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Menu, Category, Item, Price, MediaAsset, ItemMedia
+from .public_menu import single_menu_bump
+
+
+BULK_BATCH_SIZE = 500
+
+ITEM_COPY_FIELDS = [
+    'name', 'description', 'sku', 'tags', 'allergens', 'nutrition_values_json',
+    'weight_g', 'kcal', 'sort', 'visibility_rule_json',
+]
+
+MEDIA_COPY_FIELDS = [
+    'type', 'original_url', 'hls_url', 'hls_source_hash', 'poster_url', 'thumbnail_url',
+    'file_size', 'duration_seconds', 'width', 'height', 'image_variants_json',
+]
+
+
+def clone_menu(menu, locations, name=None, share_media=True):
+    """Копирует меню со всеми категориями, блюдами, ценами и медиа в каждую локацию.
+
+    Число запросов не зависит ни от размера меню, ни от числа локаций: дерево
+    читается четырьмя запросами и создаётся пачками bulk_create по уровням.
+    При share_media копии ссылаются на те же MediaAsset, иначе ассеты
+    копируются для каждой новой копии меню. Возвращает созданные меню.
+    """
+    categories = list(Category.objects.filter(menu=menu).order_by('id'))
+    items = list(Item.objects.filter(category__menu=menu).order_by('id'))
+    prices = list(Price.objects.filter(item__category__menu=menu).order_by('id'))
+    links = list(ItemMedia.objects.filter(item__category__menu=menu).select_related('media').order_by('id'))
+
+    with transaction.atomic(), single_menu_bump(menu.tenant_id):
+        menus = Menu.objects.bulk_create([
+            Menu(
+                tenant_id=menu.tenant_id,
+                location=location,
+                name=name or menu.name,
+                active=menu.active,
+                schedule_json=menu.schedule_json,
+            )
+            for location in locations
+        ])
+
+        # Для каждого уровня: (номер копии, старый id) -> новый объект
+        new_categories = {
+            (copy, category.pk): Category(
+                tenant_id=menu.tenant_id, menu=new_menu, name=category.name, sort=category.sort
+            )
+            for copy, new_menu in enumerate(menus)
+            for category in categories
+        }
+        Category.objects.bulk_create(new_categories.values(), batch_size=BULK_BATCH_SIZE)
+
+        new_items = {
+            (copy, item.pk): Item(
+                tenant_id=menu.tenant_id,
+                category=new_categories[(copy, item.category_id)],
+                **{field: getattr(item, field) for field in ITEM_COPY_FIELDS},
+            )
+            for copy in range(len(menus))
+            for item in items
+        }
+        Item.objects.bulk_create(new_items.values(), batch_size=BULK_BATCH_SIZE)
+
+        Price.objects.bulk_create([
+            Price(item=new_items[(copy, price.item_id)], amount_minor=price.amount_minor, currency=price.currency)
+            for copy in range(len(menus))
+            for price in prices
+        ], batch_size=BULK_BATCH_SIZE)
+
+        if share_media:
+            media = {(copy, link.media_id): link.media for copy in range(len(menus)) for link in links}
+        else:
+            # Копия без content_hash: хеш уникален в пределах тенанта
+            media = {
+                (copy, link.media_id): MediaAsset(
+                    tenant_id=menu.tenant_id,
+                    **{field: getattr(link.media, field) for field in MEDIA_COPY_FIELDS},
+                )
+                for copy in range(len(menus))
+                for link in links
+            }
+            MediaAsset.objects.bulk_create(media.values(), batch_size=BULK_BATCH_SIZE)
+
+        ItemMedia.objects.bulk_create([
+            ItemMedia(
+                item=new_items[(copy, link.item_id)],
+                media=media[(copy, link.media_id)],
+                kind=link.kind,
+                sort=link.sort,
+            )
+            for copy in range(len(menus))
+            for link in links
+        ], batch_size=BULK_BATCH_SIZE)
+
+    for new_menu in menus:
+        new_menu.categories_count = len(categories)
+    return menus
+
+
+def new_amount(amount, rule, round_to=1):
+    """Цена в копейках после применения правила, с округлением до кратного round_to"""
+    if rule['type'] == 'percent':
+        value = Decimal(amount) * (Decimal(100) + rule['value']) / Decimal(100)
+    else:
+        value = Decimal(amount) + rule['value']
+    steps = (value / round_to).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return max(0, int(steps) * round_to)
+
+
+def batch_update_prices(tenant, options):
+    """Пересчитывает цены тенанта по фильтрам и правилам PriceBatchUpdateSerializer.
+
+    Цены читаются одним запросом, новые значения записываются одним
+    bulk_update, версия меню повышается один раз. При dry_run ничего не
+    сохраняется. Возвращает список изменений.
+    """
+    prices = Price.objects.filter(item__tenant=tenant)
+    if 'menu' in options:
+        prices = prices.filter(item__category__menu_id=options['menu'])
+    if 'category' in options:
+        prices = prices.filter(item__category_id=options['category'])
+    if 'location' in options:
+        prices = prices.filter(item__category__menu__location_id=options['location'])
+    if 'currency' in options:
+        prices = prices.filter(currency=options['currency'])
+    rows = prices.values(
+        'id', 'item_id', 'item__name', 'item__tags', 'currency', 'amount_minor',
+        'item__category__menu__location_id',
+    ).order_by('id')
+
+    location_rules = {rule['location']: rule for rule in options['location_rules']}
+    changes = []
+    for row in rows:
+        # SQLite не умеет искать внутри JSON, теги фильтруем здесь
+        if 'tag' in options and options['tag'] not in (row['item__tags'] or []):
+            continue
+        location_id = row['item__category__menu__location_id']
+        rule = location_rules.get(location_id, options.get('rule'))
+        if rule is None:
+            continue
+        amount = new_amount(row['amount_minor'], rule, options['round_to'])
+        if amount != row['amount_minor']:
+            changes.append({
+                'price_id': row['id'],
+                'item_id': row['item_id'],
+                'item_name': row['item__name'],
+                'location_id': location_id,
+                'currency': row['currency'],
+                'old_amount_minor': row['amount_minor'],
+                'new_amount_minor': amount,
+            })
+
+    if changes and not options['dry_run']:
+        now = timezone.now()
+        with transaction.atomic(), single_menu_bump(tenant.pk):
+            Price.objects.bulk_update([
+                Price(pk=change['price_id'], amount_minor=change['new_amount_minor'], updated_at=now)
+                for change in changes
+            ], ['amount_minor', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+    return changes
+
+
+def reorder(queryset, ids, tenant_id):
+    """Проставляет sort по порядку ids одним bulk_update.
+
+    queryset ограничивает допустимые строки (тенант и родитель): если
+    какой-то id ему не принадлежит, бросается ValueError и ничего не
+    меняется. Возвращает число строк с изменившимся sort.
+    """
+    if len(set(ids)) != len(ids):
+        raise ValueError('Идентификаторы повторяются')
+    # Одна выборка проверяет принадлежность всех строк
+    rows = queryset.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in rows]
+    if missing:
+        raise ValueError(f'Не найдены: {", ".join(map(str, missing))}')
+
+    now = timezone.now()
+    changed = []
+    for position, pk in enumerate(ids):
+        row = rows[pk]
+        if row.sort != position:
+            row.sort = position
+            row.updated_at = now
+            changed.append(row)
+    if changed:
+        with transaction.atomic(), single_menu_bump(tenant_id):
+            queryset.model.objects.bulk_update(changed, ['sort', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+    return len(changed)
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_tenant_logo_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='menu_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='menu_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_tenant_menu_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('type', models.CharField(choices=[('view_category', 'Просмотр категории'), ('open_item', 'Открытие блюда'), ('play_preview', 'Воспроизведение превью'), ('play_full', 'Полный просмотр'), ('unmute', 'Включение звука'), ('share', 'Поделиться'), ('favorite', 'В избранное')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.category')),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.item')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_rollups', to='api.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'granularity', 'bucket'], name='api_analyti_tenant__a299db_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSessionSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateTimeField()),
+                ('registers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_sketches', to='api.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_analytics_session_sketch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['tenant', 'timestamp'], name='api_analyti_tenant__75a33f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['tenant', 'type', 'timestamp'], name='api_analyti_tenant__e59b53_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['item', 'type', 'timestamp'], name='api_analyti_item_id_31e501_idx'),
+        ),
+    ]
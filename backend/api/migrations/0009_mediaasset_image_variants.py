@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_analyticsevent_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='image_variants_json',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
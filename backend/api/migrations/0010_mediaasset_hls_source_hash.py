@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_mediaasset_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='hls_source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_mediaasset_hls_source_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='mediaasset',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('tenant', 'content_hash'), name='unique_media_content_hash_per_tenant'),
+        ),
+    ]
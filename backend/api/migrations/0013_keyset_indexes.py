@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tenant', 'sort', 'id'], name='category_tenant_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['tenant', 'sort', 'id'], name='item_tenant_sort_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediaasset',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('active', 'Загружается'), ('completing', 'Завершается'), ('completed', 'Завершена')], default='active', max_length=10),
+        ),
+    ]
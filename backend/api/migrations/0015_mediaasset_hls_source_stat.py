@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_mediaasset_file_size_bigint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='hls_source_stat',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
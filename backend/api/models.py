@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
@@ -58,6 +60,9 @@ class Tenant(models.Model):
     theme_json = models.JSONField(default=dict, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     plan = models.CharField(max_length=20, choices=PLAN_CHOICES, default='free')
+    # Версия содержимого публичного меню, растёт при любом изменении дерева меню
+    menu_version = models.PositiveIntegerField(default=0)
+    menu_updated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -98,6 +103,16 @@ class Category(models.Model):
     
     class Meta:
         ordering = ['sort', 'name']
+        indexes = [
+            # Keyset-пагинация списка категорий (api/pagination.py)
+            models.Index(fields=['tenant', 'sort', 'id'], name='category_tenant_sort_idx'),
+        ]
+
+
+class ItemQuerySet(models.QuerySet):
+    def with_related(self):
+        """Блюда вместе со всем, что отдаёт ItemSerializer, за постоянное число запросов"""
+        return self.select_related('category').prefetch_related('prices', 'item_media__media')
 
 
 class Item(models.Model):
@@ -117,8 +132,14 @@ class Item(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ItemQuerySet.as_manager()
+    
     class Meta:
         ordering = ['sort', 'name']
+        indexes = [
+            # Keyset-пагинация списка блюд (api/pagination.py)
+            models.Index(fields=['tenant', 'sort', 'id'], name='item_tenant_sort_idx'),
+        ]
 
 
 class Price(models.Model):
@@ -142,15 +163,33 @@ class MediaAsset(models.Model):
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     original_url = models.URLField()
     hls_url = models.URLField(blank=True)
+    # SHA-256 исходника, из которого собран HLS
+    hls_source_hash = models.CharField(max_length=64, blank=True)
+    # inode, размер и mtime исходника при последней проверке HLS: пока они те же,
+    # файл не хешируется заново
+    hls_source_stat = models.CharField(max_length=100, blank=True)
     poster_url = models.URLField(blank=True)
     thumbnail_url = models.URLField(blank=True)
-    file_size = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
     duration_seconds = models.PositiveIntegerField(null=True, blank=True)
     width = models.PositiveIntegerField(null=True, blank=True)
     height = models.PositiveIntegerField(null=True, blank=True)
+    # Уменьшенные копии постера: [{'url', 'width', 'height', 'type'}, ...]
+    image_variants_json = models.JSONField(default=list, blank=True)
+    # SHA-256 содержимого загруженного файла, пусто для внешних ссылок
+    content_hash = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'content_hash'],
+                condition=~models.Q(content_hash=''),
+                name='unique_media_content_hash_per_tenant',
+            ),
+        ]
+
 
 class ItemMedia(models.Model):
     """Связь блюда с медиа"""
@@ -170,6 +209,30 @@ class ItemMedia(models.Model):
         ordering = ['sort']
 
 
+class UploadSession(models.Model):
+    """Докачиваемая загрузка медиа файла по частям"""
+    STATUS_CHOICES = [
+        ('active', 'Загружается'),
+        ('completing', 'Завершается'),
+        ('completed', 'Завершена'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='upload_sessions')
+    type = models.CharField(max_length=10, choices=MediaAsset.TYPE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Ожидаемый SHA-256 файла, проверяется при завершении
+    sha256 = models.CharField(max_length=64, blank=True)
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    media = models.ForeignKey(
+        MediaAsset, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class AnalyticsEvent(models.Model):
     """Событие аналитики"""
     TYPE_CHOICES = [
@@ -190,6 +253,54 @@ class AnalyticsEvent(models.Model):
     metadata_json = models.JSONField(default=dict, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        # Под запросы дашборда: окно по tenant + timestamp, фильтр по type,
+        # статистика по блюду
+        indexes = [
+            models.Index(fields=['tenant', 'timestamp']),
+            models.Index(fields=['tenant', 'type', 'timestamp']),
+            models.Index(fields=['item', 'type', 'timestamp']),
+        ]
+
+
+class AnalyticsRollup(models.Model):
+    """Агрегат событий аналитики за час или сутки (UTC)"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Час'),
+        ('day', 'Сутки'),
+    ]
+    
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='analytics_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()  # Начало интервала
+    type = models.CharField(max_length=20, choices=AnalyticsEvent.TYPE_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    item = models.ForeignKey(Item, on_delete=models.SET_NULL, null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'granularity', 'bucket']),
+        ]
+
+
+class AnalyticsSessionSketch(models.Model):
+    """HyperLogLog-скетч session_id за сутки (UTC)"""
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='session_sketches')
+    day = models.DateTimeField()  # Начало суток
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = [('tenant', 'day')]
+
+
+class AnalyticsRollupCursor(models.Model):
+    """Последнее событие, учтённое в агрегатах"""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class QRCode(models.Model):
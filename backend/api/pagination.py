@@ -0,0 +1,156 @@
+"""Keyset-пагинация.
+
+Страница выбирается условием по ключу сортировки последней строки
+предыдущей страницы вместо OFFSET, поэтому стоимость не растёт с номером
+страницы. Ключ включает id, порядок строк всегда однозначен. COUNT(*)
+выполняется только по запросу (?count=true).
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Базовый класс: ordering — поля ключа, последним должен быть id"""
+    ordering = ('sort', 'id')
+    page_size = 20
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) == 'true' else None
+        if values is not None:
+            queryset = queryset.filter(self.after(ordering, values))
+
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_key = self.key(rows[-1]) if rows and (has_more or reverse) else None
+        self.previous_key = self.key(rows[0]) if rows and (values is not None and (has_more or not reverse)) else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, values):
+        """Условие «строго после ключа values» для сортировки ordering"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def key(self, row):
+        values = []
+        for field in self.ordering:
+            value = getattr(row, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def decode_cursor(self, request, model):
+        """Значения ключа и направление из курсора, приведённые к типам полей model"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse = cursor['k'], bool(cursor.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeEncodeError):
+            raise NotFound('Некорректный курсор')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Некорректный курсор')
+        try:
+            values = [self._to_field_value(model, field, value) for field, value in zip(self.ordering, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound('Некорректный курсор')
+        return values, reverse
+
+    @staticmethod
+    def _to_field_value(model, field, value):
+        if value is None:
+            raise ValueError('Пустое значение ключа')
+        model_field = model._meta.get_field(field.lstrip('-'))
+        return model_field.get_prep_value(model_field.to_python(value))
+
+    def encode_cursor(self, values, reverse):
+        cursor = {'k': values}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return self.encode_cursor(self.next_key, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_key is None:
+            return None
+        return self.encode_cursor(self.previous_key, reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class SortKeysetPagination(KeysetPagination):
+    """Категории и блюда в порядке sort"""
+    ordering = ('sort', 'id')
+
+
+class EventKeysetPagination(KeysetPagination):
+    """События аналитики, новые первыми"""
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    max_page_size = 500
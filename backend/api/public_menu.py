@@ -0,0 +1,170 @@
+"""Снапшоты публичного меню.
+
+Полностью отрендеренный JSON гостевого меню хранится в кэше под ключом
+с версией содержимого тенанта (Tenant.menu_version). Версия повышается
+при любом изменении дерева меню (см. api/signals.py), поэтому старые
+снапшоты просто перестают читаться и истекают по TTL.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Tenant, Menu
+
+
+SNAPSHOT_KEY_PREFIX = 'public_menu'
+
+
+def snapshot_key(tenant):
+    return f'{SNAPSHOT_KEY_PREFIX}:{tenant.pk}:{menu_etag(tenant)}'
+
+
+def menu_last_modified(tenant):
+    """Время последнего изменения содержимого меню"""
+    return tenant.menu_updated_at or tenant.updated_at
+
+
+def menu_etag(tenant):
+    """Строгий ETag содержимого меню (без кавычек)"""
+    # Время входит в ETag на случай, если сохранение тенанта с устаревшим
+    # menu_version откатит счётчик
+    modified = menu_last_modified(tenant)
+    stamp = int(modified.timestamp() * 1000000) if modified else 0
+    return f'{tenant.pk}-{tenant.menu_version}-{stamp}'
+
+
+def bump_menu_version(tenant_id):
+    """Повышает версию меню тенанта одним UPDATE без сигналов"""
+    Tenant.objects.filter(pk=tenant_id).update(
+        menu_version=F('menu_version') + 1,
+        menu_updated_at=timezone.now(),
+    )
+
+
+_bump_state = threading.local()
+
+
+def menu_bumps_suppressed():
+    return getattr(_bump_state, 'depth', 0) > 0
+
+
+@contextmanager
+def single_menu_bump(tenant_id):
+    """Массовые изменения дерева меню внутри блока повышают версию один раз.
+
+    Сигналы отдельных строк версию не трогают (и не ищут тенанта), после
+    успешного выполнения блока версия повышается одним UPDATE.
+    """
+    _bump_state.depth = getattr(_bump_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _bump_state.depth -= 1
+    bump_menu_version(tenant_id)
+
+
+def build_public_menu(tenant):
+    """Сборка вложенной структуры tenant→menus→categories→items для гостей"""
+    # Получаем все активные меню тенанта с категориями и блюдами
+    menus = Menu.objects.filter(
+        tenant=tenant,
+        active=True
+    ).prefetch_related(
+        'categories__items__prices',
+        'categories__items__item_media__media'
+    )
+
+    # Формируем данные для ответа
+    menu_data = {
+        'tenant': {
+            'name': tenant.name,
+            'slug': tenant.slug,
+            'theme': {
+                'palette_json': tenant.theme_json or '{}',
+                'logo_url': tenant.logo_url or '',
+            }
+        },
+        'menus': []
+    }
+
+    for menu in menus:
+        menu_dict = {
+            'id': str(menu.id),
+            'name': menu.name,
+            'categories': []
+        }
+
+        for category in menu.categories.all():
+            category_dict = {
+                'id': str(category.id),
+                'name': category.name,
+                'items': []
+            }
+
+            for item in category.items.all():
+                item_dict = {
+                    'id': str(item.id),
+                    'name': item.name,
+                    'description': item.description or '',
+                    'tags': item.tags or [],
+                    'allergens': item.allergens or [],
+                    'weight_g': item.weight_g,
+                    'kcal': item.kcal,
+                    'prices': [],
+                    'item_media': []
+                }
+
+                # Добавляем цены
+                for price in item.prices.all():
+                    item_dict['prices'].append({
+                        'amount_minor': price.amount_minor,
+                        'currency': price.currency,
+                    })
+
+                # Добавляем медиа
+                for item_media in item.item_media.all():
+                    media = item_media.media
+                    media_dict = {
+                        'kind': item_media.kind,
+                        'media': {
+                            'type': media.type,
+                            'original_url': media.original_url or '',
+                            'hls_url': media.hls_url or '',
+                            'poster_url': media.poster_url or '',
+                            # Варианты постера по возрастанию ширины, для srcset
+                            'poster_srcset': media.image_variants_json or [],
+                            'duration_ms': media.duration_seconds * 1000 if media.duration_seconds else None,
+                        }
+                    }
+                    item_dict['item_media'].append(media_dict)
+
+                category_dict['items'].append(item_dict)
+
+            menu_dict['categories'].append(category_dict)
+
+        menu_data['menus'].append(menu_dict)
+
+    return menu_data
+
+
+def render_public_menu(tenant):
+    """JSON-байты ответа публичного API для тенанта"""
+    return JSONRenderer().render({
+        'success': True,
+        'data': build_public_menu(tenant),
+    })
+
+
+def get_public_menu_snapshot(tenant):
+    """Возвращает готовые байты меню текущей версии, собирая их при промахе"""
+    key = snapshot_key(tenant)
+    content = cache.get(key)
+    if content is None:
+        content = render_public_menu(tenant)
+        cache.set(key, content, settings.PUBLIC_MENU_SNAPSHOT_TTL)
+    return content
@@ -0,0 +1,172 @@
+"""Локальная генерация QR-кодов.
+
+Изображения складываются в MEDIA_ROOT/qr/ под именем, равным хешу данных
+и параметров рендеринга, поэтому повторная генерация того же кода не
+выполняется.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import qrcode
+import qrcode.constants
+from qrcode.image.pil import PilImage
+from qrcode.image.svg import SvgPathImage
+from django.conf import settings
+
+from .utils import LazyExecutor, atomic_write
+
+
+ERROR_LEVELS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+CACHE_DIR = 'qr'
+
+
+def normalize_options(fmt=None, size=None, error_level=None, border=None):
+    """Параметры рендеринга с подставленными значениями по умолчанию.
+
+    Бросает ValueError при недопустимых значениях.
+    """
+    defaults = settings.QR_CODE
+    fmt = (fmt or defaults['FORMAT']).lower()
+    error_level = (error_level or defaults['ERROR_LEVEL']).upper()
+    size = int(size or defaults['SIZE'])
+    border = int(defaults['BORDER'] if border in (None, '') else border)
+    if fmt not in FORMATS:
+        raise ValueError(f'Неизвестный формат: {fmt}')
+    if error_level not in ERROR_LEVELS:
+        raise ValueError(f'Неизвестный уровень коррекции: {error_level}')
+    if not 64 <= size <= 4096:
+        raise ValueError('Размер должен быть от 64 до 4096 пикселей')
+    if not 0 <= border <= 20:
+        raise ValueError('Отступ должен быть от 0 до 20 модулей')
+    return {'fmt': fmt, 'size': size, 'error_level': error_level, 'border': border}
+
+
+def cache_path(data, fmt, size, error_level, border):
+    """Путь к изображению относительно MEDIA_ROOT"""
+    digest = hashlib.sha256(f'{data}\0{fmt}\0{size}\0{error_level}\0{border}'.encode('utf-8')).hexdigest()
+    return f'{CACHE_DIR}/{digest[:2]}/{digest}.{fmt}'
+
+
+def render_qr(data, fmt, size, error_level, border):
+    """Байты изображения QR-кода"""
+    qr = qrcode.QRCode(error_correction=ERROR_LEVELS[error_level], border=border, box_size=1)
+    qr.add_data(data)
+    qr.make(fit=True)
+    # Размер модуля подбираем так, чтобы картинка была не больше size пикселей
+    qr.box_size = max(1, size // (qr.modules_count + 2 * border))
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        qr.make_image(image_factory=PilImage).save(buffer)
+    return buffer.getvalue()
+
+
+def ensure_qr_image(data, fmt, size, error_level, border, media_root=None):
+    """Генерирует изображение, если его ещё нет в кэше; возвращает относительный путь"""
+    relative = cache_path(data, fmt, size, error_level, border)
+    path = Path(media_root or settings.MEDIA_ROOT) / relative
+    if path.exists():
+        return relative
+
+    content = render_qr(data, fmt, size, error_level, border)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Пишем во временный файл и переименовываем, чтобы параллельные
+    # запросы не увидели недописанное изображение
+    with atomic_write(path) as tmp:
+        tmp.write(content)
+    return relative
+
+
+def media_url(relative):
+    return f'{settings.MEDIA_URL}{relative}'
+
+
+def table_url(base_url, table):
+    """Адрес меню с номером стола в параметре table"""
+    parts = urlsplit(base_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != 'table']
+    query.append(('table', str(table)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+# spawn: воркеры не наследуют потоки и блокировки процесса Django
+_process_pool = LazyExecutor(lambda: ProcessPoolExecutor(
+    max_workers=settings.QR_RENDER_WORKERS or os.cpu_count(),
+    mp_context=multiprocessing.get_context('spawn'),
+))
+
+
+def _render_job(job):
+    data, options, media_root = job
+    return ensure_qr_image(data, media_root=media_root, **options)
+
+
+def ensure_qr_images(data_list, options):
+    """Генерирует пачку QR-кодов, большие пачки — параллельно на всех ядрах.
+
+    Возвращает относительные пути в порядке data_list.
+    """
+    media_root = str(settings.MEDIA_ROOT)
+    jobs = [(data, options, media_root) for data in data_list]
+    if len(jobs) < settings.QR_PARALLEL_THRESHOLD:
+        return [_render_job(job) for job in jobs]
+    return list(_process_pool.get().map(_render_job, jobs, chunksize=8))
+
+
+class _ZipOutput:
+    """Неперематываемый поток, из которого забираются готовые куски ZIP"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(files, chunk_size=64 * 1024):
+    """Генератор ZIP-архива из [(имя в архиве, путь к файлу)].
+
+    Файлы читаются кусками, архив целиком в памяти не собирается.
+    """
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            with open(path, 'rb') as source, archive.open(name, 'w') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = output.take()
+                    if data:
+                        yield data
+    # Центральный каталог дописывается при закрытии архива
+    yield output.take()
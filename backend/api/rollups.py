@@ -0,0 +1,295 @@
+"""Почасовые и суточные агрегаты событий аналитики.
+
+Агрегаты пополняются инкрементально командой rollup_analytics: курсор
+AnalyticsRollupCursor хранит id последнего учтённого события, поэтому каждое
+событие попадает в агрегаты ровно один раз, даже если его timestamp в прошлом.
+Запросы дашборда читают агрегаты и добирают из сырых событий только хвост
+с id больше курсора.
+
+Уникальные сессии хранятся суточными HyperLogLog-скетчами (см. api/hll.py).
+
+Интервалы считаются в UTC. Агрегаты покрывают только полные часы окна
+(полные сутки для скетчей уникальных сессий и для прошлого старше
+ANALYTICS_HOURLY_ROLLUP_DAYS, где почасовые агрегаты уже удалены); неполные
+часы по краям окна считаются по сырым событиям.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .models import AnalyticsEvent, AnalyticsRollup, AnalyticsRollupCursor, AnalyticsSessionSketch
+
+
+CURSOR_NAME = 'analytics_rollup'
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def floor_hour(value):
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    return floor_hour(value).replace(hour=0)
+
+
+def ceil_hour(value):
+    floored = floor_hour(value)
+    return floored if floored == value else floored + HOUR
+
+
+def ceil_day(value):
+    floored = floor_day(value)
+    return floored if floored == value else floored + DAY
+
+
+def get_cursor_position():
+    return AnalyticsRollupCursor.objects.filter(name=CURSOR_NAME).values_list(
+        'last_event_id', flat=True
+    ).first() or 0
+
+
+def rollup_events(chunk_size=10000):
+    """Добавляет в агрегаты новые события, возвращает их число.
+
+    Учитываются только события, созданные раньше чем ANALYTICS_ROLLUP_SETTLE_SECONDS
+    назад, чтобы транзакции, закоммиченные не по порядку id, не были пропущены.
+    created_at не растёт строго вместе с id (он ставится до INSERT), поэтому
+    проход останавливается перед первым ещё не «отстоявшимся» id: курсор не
+    должен перескочить событие, которое попадёт в агрегаты только позже.
+    """
+    settled_before = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_SETTLE_SECONDS)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = AnalyticsRollupCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+            pending = AnalyticsEvent.objects.filter(id__gt=cursor.last_event_id)
+            first_unsettled = pending.filter(created_at__gte=settled_before).order_by('id').values_list(
+                'id', flat=True
+            ).first()
+            if first_unsettled is not None:
+                pending = pending.filter(id__lt=first_unsettled)
+            events = list(
+                pending.order_by('id').values_list(
+                    'id', 'tenant_id', 'type', 'category_id', 'item_id', 'timestamp', 'session_id'
+                )[:chunk_size]
+            )
+            if not events:
+                return processed
+
+            counts = Counter()
+            sessions = {}
+            for _, tenant_id, event_type, category_id, item_id, timestamp, session_id in events:
+                hour = floor_hour(timestamp)
+                day = hour.replace(hour=0)
+                counts[(tenant_id, 'hour', hour, event_type, category_id, item_id)] += 1
+                counts[(tenant_id, 'day', day, event_type, category_id, item_id)] += 1
+                sessions.setdefault((tenant_id, day), set()).add(session_id)
+            _apply_counts(counts)
+            _apply_sessions(sessions)
+
+            cursor.last_event_id = events[-1][0]
+            cursor.save(update_fields=['last_event_id', 'updated_at'])
+            processed += len(events)
+
+        if len(events) < chunk_size:
+            return processed
+
+
+def _apply_counts(counts):
+    """Прибавляет счётчики к существующим агрегатам или создаёт новые"""
+    tenant_ids = {key[0] for key in counts}
+    buckets = {key[2] for key in counts}
+    existing = {}
+    for rollup in AnalyticsRollup.objects.filter(tenant_id__in=tenant_ids, bucket__in=buckets):
+        key = (
+            rollup.tenant_id, rollup.granularity, rollup.bucket,
+            rollup.type, rollup.category_id, rollup.item_id,
+        )
+        existing.setdefault(key, rollup)
+
+    to_update = []
+    to_create = []
+    for key, count in counts.items():
+        rollup = existing.get(key)
+        if rollup is not None:
+            rollup.count += count
+            to_update.append(rollup)
+        else:
+            tenant_id, granularity, bucket, event_type, category_id, item_id = key
+            to_create.append(AnalyticsRollup(
+                tenant_id=tenant_id,
+                granularity=granularity,
+                bucket=bucket,
+                type=event_type,
+                category_id=category_id,
+                item_id=item_id,
+                count=count,
+            ))
+
+    AnalyticsRollup.objects.bulk_update(to_update, ['count'], batch_size=500)
+    AnalyticsRollup.objects.bulk_create(to_create, batch_size=500)
+
+
+def _apply_sessions(sessions):
+    """Добавляет session_id в суточные скетчи"""
+    tenant_ids = {tenant_id for tenant_id, _ in sessions}
+    days = {day for _, day in sessions}
+    existing = {
+        (sketch.tenant_id, sketch.day): sketch
+        for sketch in AnalyticsSessionSketch.objects.filter(tenant_id__in=tenant_ids, day__in=days)
+    }
+
+    to_update = []
+    to_create = []
+    for (tenant_id, day), session_ids in sessions.items():
+        sketch = existing.get((tenant_id, day))
+        hll = HyperLogLog(sketch.registers if sketch is not None else None)
+        hll.update(session_ids)
+        if sketch is not None:
+            sketch.registers = hll.to_bytes()
+            to_update.append(sketch)
+        else:
+            to_create.append(AnalyticsSessionSketch(tenant_id=tenant_id, day=day, registers=hll.to_bytes()))
+
+    AnalyticsSessionSketch.objects.bulk_update(to_update, ['registers'], batch_size=100)
+    AnalyticsSessionSketch.objects.bulk_create(to_create, batch_size=100)
+
+
+def hourly_rollup_horizon():
+    """Граница, старше которой остаются только суточные агрегаты"""
+    return floor_day(timezone.now() - timedelta(days=settings.ANALYTICS_HOURLY_ROLLUP_DAYS))
+
+
+def window_bounds(start, end):
+    """Часть окна [start, end) из полных часов (или суток в старом прошлом)"""
+    horizon = hourly_rollup_horizon()
+    start = ceil_day(start) if start < horizon else ceil_hour(start)
+    end = floor_day(end) if end <= horizon else floor_hour(end)
+    return start, end
+
+
+def downsample_hourly_rollups():
+    """Удаляет почасовые агрегаты, уже покрытые суточными, возвращает их число"""
+    deleted, _ = AnalyticsRollup.objects.filter(
+        granularity='hour', bucket__lt=hourly_rollup_horizon()
+    ).delete()
+    return deleted
+
+
+def rollup_window_q(start, end):
+    """Условие на агрегаты, покрывающие окно ровно один раз.
+
+    Полные сутки берутся из суточных агрегатов, неполные сутки по краям окна
+    из почасовых.
+    """
+    start, end = window_bounds(start, end)
+    first_day = ceil_day(start)
+    last_day = floor_day(end)
+    if first_day >= last_day:
+        return Q(granularity='hour', bucket__gte=start, bucket__lt=end)
+    return (
+        Q(granularity='day', bucket__gte=first_day, bucket__lt=last_day)
+        | Q(granularity='hour', bucket__gte=start, bucket__lt=first_day)
+        | Q(granularity='hour', bucket__gte=last_day, bucket__lt=end)
+    )
+
+
+def tail_events(tenant, start, end, cursor_position=None):
+    """Сырые события окна, которых нет в агрегатах rollup_window_q.
+
+    Это события неполных часов по краям окна и события полных часов,
+    ещё не учтённые курсором.
+    """
+    if cursor_position is None:
+        cursor_position = get_cursor_position()
+    covered_start, covered_end = window_bounds(start, end)
+    if covered_start >= covered_end:
+        return AnalyticsEvent.objects.filter(tenant=tenant, timestamp__gte=start, timestamp__lt=end)
+    raw = Q(timestamp__gte=covered_start, timestamp__lt=covered_end, id__gt=cursor_position)
+    if start < covered_start:
+        raw |= Q(timestamp__gte=start, timestamp__lt=covered_start)
+    if covered_end < end:
+        raw |= Q(timestamp__gte=covered_end, timestamp__lt=end)
+    return AnalyticsEvent.objects.filter(raw, tenant=tenant)
+
+
+def event_totals(tenant, start, end, groups, cursor_position=None):
+    """Число событий по группам типов за окно одним запросом.
+
+    groups — {'имя': [типы событий]}. Суммы по агрегатам и хвост сырых
+    событий считаются условными агрегатами в одном SQL-запросе.
+    """
+    tail = tail_events(tenant, start, end, cursor_position).order_by().values('tenant')
+    aggregates = {}
+    for name, types in groups.items():
+        tail_count = tail.annotate(total=Count('id', filter=Q(type__in=types))).values('total')
+        aggregates[name] = (
+            Coalesce(Sum('count', filter=Q(type__in=types)), 0)
+            + Coalesce(Subquery(tail_count), 0)
+        )
+    return AnalyticsRollup.objects.filter(
+        rollup_window_q(start, end), tenant=tenant
+    ).aggregate(**aggregates)
+
+
+def top_item_counts(tenant, start, end, types, limit, cursor_position=None):
+    """Самые популярные блюда за окно: [(item_id, число событий), ...]"""
+    counts = Counter()
+    rollups = AnalyticsRollup.objects.filter(
+        rollup_window_q(start, end), tenant=tenant, type__in=types, item__isnull=False
+    ).values('item_id').annotate(total=Sum('count'))
+    for row in rollups:
+        counts[row['item_id']] += row['total']
+    tail = tail_events(tenant, start, end, cursor_position).filter(
+        type__in=types, item__isnull=False
+    ).values('item_id').annotate(total=Count('id'))
+    for row in tail:
+        counts[row['item_id']] += row['total']
+    return counts.most_common(limit)
+
+
+def approximate_unique_sessions(tenant, start, end, cursor_position=None):
+    """Оценка числа уникальных session_id за окно [start, end).
+
+    Суточные скетчи берутся только для суток, целиком лежащих в окне;
+    неполные сутки по краям окна добавляются в тот же HyperLogLog по сырым
+    событиям.
+    """
+    full_start, full_end = ceil_day(start), floor_day(end)
+    raw = AnalyticsEvent.objects.filter(tenant=tenant)
+    hll = HyperLogLog()
+    if full_start >= full_end:
+        edges = [(start, end)]
+    else:
+        edges = [(start, full_start), (full_end, end)]
+        sketches = AnalyticsSessionSketch.objects.filter(
+            tenant=tenant, day__gte=full_start, day__lt=full_end
+        ).values_list('registers', flat=True)
+        for registers in sketches:
+            hll.merge(HyperLogLog(registers))
+        hll.update(
+            tail_events(tenant, full_start, full_end, cursor_position)
+            .values_list('session_id', flat=True).distinct()
+        )
+    for edge_start, edge_end in edges:
+        if edge_start < edge_end:
+            hll.update(
+                raw.filter(timestamp__gte=edge_start, timestamp__lt=edge_end)
+                .values_list('session_id', flat=True).distinct()
+            )
+    return hll.count()
+
+
+def exact_unique_sessions(tenant, start, end):
+    """Точное число уникальных session_id по сырым событиям окна [start, end)"""
+    return AnalyticsEvent.objects.filter(
+        tenant=tenant, timestamp__gte=start, timestamp__lt=end
+    ).aggregate(total=Count('session_id', distinct=True))['total']
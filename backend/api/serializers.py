@@ -1,7 +1,11 @@
+import mimetypes
+
+from django.conf import settings
 from rest_framework import serializers
+from .media import media_type_for
 from .models import (
     User, Tenant, Location, Menu, Category, Item, Price, 
-    MediaAsset, ItemMedia, AnalyticsEvent, QRCode
+    MediaAsset, ItemMedia, UploadSession, AnalyticsEvent, QRCode
 )
 
 
@@ -9,6 +13,7 @@ class TenantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tenant
         fields = '__all__'
+        read_only_fields = ['menu_version', 'menu_updated_at']
 
 
 class LocationSerializer(serializers.ModelSerializer):
@@ -19,6 +24,9 @@ class LocationSerializer(serializers.ModelSerializer):
         exclude = ['tenant']  # Исключаем tenant, так как он добавляется автоматически
     
     def get_menus_count(self, obj):
+        # Список отдаёт аннотацию из LocationViewSet, после создания её нет
+        if hasattr(obj, 'menus_count'):
+            return obj.menus_count
         return obj.menus.count()
 
 
@@ -31,6 +39,8 @@ class MenuSerializer(serializers.ModelSerializer):
         exclude = ['tenant']  # Исключаем tenant, так как он добавляется автоматически
     
     def get_categories_count(self, obj):
+        if hasattr(obj, 'categories_count'):
+            return obj.categories_count
         return obj.categories.count()
 
 
@@ -43,6 +53,8 @@ class CategorySerializer(serializers.ModelSerializer):
         exclude = ['tenant']  # Исключаем tenant, так как он добавляется автоматически
     
     def get_items_count(self, obj):
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
         return obj.items.count()
 
 
@@ -56,6 +68,33 @@ class MediaAssetSerializer(serializers.ModelSerializer):
     class Meta:
         model = MediaAsset
         fields = '__all__'
+        read_only_fields = ['tenant', 'content_hash', 'hls_source_hash', 'image_variants_json']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    type = serializers.ChoiceField(choices=MediaAsset.TYPE_CHOICES, required=False)
+    
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'type', 'filename', 'size', 'sha256', 'received_bytes', 'status', 'media', 'created_at']
+        read_only_fields = ['received_bytes', 'status', 'media', 'created_at']
+    
+    def validate_size(self, value):
+        if not 0 < value <= settings.MEDIA_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f'Размер файла должен быть от 1 байта до {settings.MEDIA_UPLOAD_MAX_BYTES} байт'
+            )
+        return value
+    
+    def validate(self, attrs):
+        # Тип по расширению имени файла, если клиент его не указал
+        if not attrs.get('type'):
+            attrs['type'] = media_type_for(mimetypes.guess_type(attrs['filename'])[0])
+            if attrs['type'] is None:
+                raise serializers.ValidationError({'type': 'Не удалось определить тип файла'})
+        attrs['sha256'] = attrs.get('sha256', '').lower()
+        return attrs
 
 
 class ItemMediaSerializer(serializers.ModelSerializer):
@@ -93,6 +132,106 @@ class AnalyticsEventSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AnalyticsEventInputSerializer(serializers.Serializer):
+    """Событие аналитики, присланное клиентом"""
+    session_id = serializers.CharField(max_length=255)
+    type = serializers.ChoiceField(choices=AnalyticsEvent.TYPE_CHOICES)
+    category_id = serializers.IntegerField(required=False, allow_null=True)
+    item_id = serializers.IntegerField(required=False, allow_null=True)
+    metadata = serializers.DictField(required=False, default=dict)
+    timestamp = serializers.DateTimeField(required=False)
+
+
+class PriceRuleSerializer(serializers.Serializer):
+    """Изменение цены: percent — на value процентов, absolute — на value копеек"""
+    type = serializers.ChoiceField(choices=['percent', 'absolute'])
+    value = serializers.DecimalField(max_digits=12, decimal_places=2)
+    
+    def validate(self, attrs):
+        if attrs['type'] == 'percent' and attrs['value'] <= -100:
+            raise serializers.ValidationError('Процент должен быть больше -100')
+        return attrs
+
+
+class LocationPriceRuleSerializer(PriceRuleSerializer):
+    location = serializers.IntegerField()
+
+
+class ReorderSerializer(serializers.Serializer):
+    # id строк в нужном порядке
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    
+    def validate_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Идентификаторы повторяются')
+        return value
+
+
+class CategoryReorderSerializer(ReorderSerializer):
+    menu = serializers.IntegerField()
+
+
+class ItemReorderSerializer(ReorderSerializer):
+    category = serializers.IntegerField()
+
+
+class PriceBatchUpdateSerializer(serializers.Serializer):
+    menu = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    location = serializers.IntegerField(required=False)
+    tag = serializers.CharField(required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+    rule = PriceRuleSerializer(required=False)
+    # Правила для отдельных локаций заменяют общее правило
+    location_rules = LocationPriceRuleSerializer(many=True, required=False, default=list)
+    # Округление до кратного (в копейках), например 100 — до целых рублей
+    round_to = serializers.IntegerField(min_value=1, required=False, default=1)
+    dry_run = serializers.BooleanField(required=False, default=False)
+    
+    def validate(self, attrs):
+        if 'rule' not in attrs and not attrs['location_rules']:
+            raise serializers.ValidationError('Укажите rule или location_rules')
+        return attrs
+
+
+# Импорт меню: отсутствующее поле не меняет существующее значение
+class MenuImportPriceSerializer(serializers.Serializer):
+    amount_minor = serializers.IntegerField(min_value=0)
+    currency = serializers.CharField(max_length=3, required=False)
+
+
+class MenuImportMediaSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=ItemMedia.KIND_CHOICES)
+    type = serializers.ChoiceField(choices=MediaAsset.TYPE_CHOICES, required=False)
+    url = serializers.URLField()
+    poster_url = serializers.URLField(required=False, allow_blank=True)
+    sort = serializers.IntegerField(min_value=0, required=False)
+
+
+class MenuImportItemSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True)
+    tags = serializers.ListField(child=serializers.CharField(), required=False)
+    allergens = serializers.ListField(child=serializers.CharField(), required=False)
+    nutrition = serializers.DictField(required=False)
+    weight_g = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    kcal = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    sort = serializers.IntegerField(min_value=0, required=False)
+    prices = MenuImportPriceSerializer(many=True, required=False)
+    media = MenuImportMediaSerializer(many=True, required=False)
+
+
+class MenuImportCategorySerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    sort = serializers.IntegerField(min_value=0, required=False)
+    items = MenuImportItemSerializer(many=True, required=False, default=list)
+
+
+class MenuImportSerializer(serializers.Serializer):
+    categories = MenuImportCategorySerializer(many=True)
+
+
 class QRCodeSerializer(serializers.ModelSerializer):
     location_name = serializers.CharField(source='location.name', read_only=True)
     
@@ -106,8 +245,13 @@ class DashboardStatsSerializer(serializers.Serializer):
     total_menus = serializers.IntegerField()
     total_categories = serializers.IntegerField()
     total_items = serializers.IntegerField()
+    period_start = serializers.DateTimeField()
+    period_end = serializers.DateTimeField()
     total_views = serializers.IntegerField()
     total_plays = serializers.IntegerField()
     unique_users = serializers.IntegerField()
+    unique_users_exact = serializers.BooleanField()
+    # Относительная стандартная ошибка оценки unique_users
+    unique_users_error = serializers.FloatField()
     recent_activity = AnalyticsEventSerializer(many=True)
     top_items = ItemSerializer(many=True)
@@ -0,0 +1,50 @@
+"""Обработчики сигналов моделей"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Tenant, Menu, Category, Item, Price, MediaAsset, ItemMedia
+from .media import schedule_probe
+from .public_menu import bump_menu_version, menu_bumps_suppressed
+
+
+def _menu_tree_tenant_id(instance):
+    """Тенант, к дереву меню которого относится объект"""
+    if isinstance(instance, (Price, ItemMedia)):
+        return Item.objects.filter(pk=instance.item_id).values_list('tenant_id', flat=True).first()
+    return instance.tenant_id
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Price)
+@receiver(post_save, sender=MediaAsset)
+@receiver(post_save, sender=ItemMedia)
+@receiver(post_delete, sender=Menu)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Price)
+@receiver(post_delete, sender=MediaAsset)
+@receiver(post_delete, sender=ItemMedia)
+def menu_tree_changed(sender, instance, **kwargs):
+    """Повышаем версию публичного меню в той же транзакции, что и изменение"""
+    if menu_bumps_suppressed():
+        return
+    tenant_id = _menu_tree_tenant_id(instance)
+    if tenant_id is not None:
+        bump_menu_version(tenant_id)
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    """Название, тема и логотип тенанта входят в снапшот меню"""
+    bump_menu_version(instance.pk)
+
+
+@receiver(post_save, sender=MediaAsset)
+def media_asset_created(sender, instance, created, **kwargs):
+    """Метаданные нового локального файла определяем после коммита в фоне"""
+    if created and settings.MEDIA_PROBE_ON_CREATE:
+        transaction.on_commit(lambda: schedule_probe(instance))
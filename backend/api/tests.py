@@ -1,3 +1,869 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .analytics import AnalyticsBuffer, record_events
+from .dashboard import compute_stats, resolve_period, PeriodError
+from .hls import package_asset
+from .media import file_sha256, media_file_url, missing_metadata_q
+from .models import (
+    User, Tenant, Location, Menu, Category, Item, Price, MediaAsset, ItemMedia, AnalyticsEvent, QRCode,
+    AnalyticsRollup, UploadSession,
+)
+from .public_menu import single_menu_bump
+from .rollups import (
+    floor_day, floor_hour, get_cursor_position, rollup_events,
+    approximate_unique_sessions, exact_unique_sessions,
+)
+
+
+def create_menu_tree(tenant):
+    location = Location.objects.create(tenant=tenant, name='Зал')
+    menu = Menu.objects.create(tenant=tenant, location=location, name='Основное')
+    category = Category.objects.create(tenant=tenant, menu=menu, name='Горячее')
+    item = Item.objects.create(tenant=tenant, category=category, name='Стейк')
+    return location, menu, category, item
+
+
+class TenantApiTestCase(TestCase):
+    """Тенант, его менеджер и авторизованный APIClient"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+        cls.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='password', tenant=cls.tenant
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+
+class TempMediaRootMixin:
+    """MEDIA_ROOT во временном каталоге на время теста"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+class AnalyticsQueryPlanTests(TenantApiTestCase):
+    """Запросы дашборда к api_analyticsevent должны идти по индексам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, _, category, item = create_menu_tree(cls.tenant)
+        AnalyticsEvent.objects.bulk_create([
+            AnalyticsEvent(tenant=cls.tenant, session_id=f's{n}', type=event_type, category=category, item=item)
+            for n in range(5)
+            for event_type in ('view_category', 'open_item', 'play_preview')
+        ])
+
+    def assert_event_queries_use_indexes(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        event_queries = [query['sql'] for query in context.captured_queries if 'api_analyticsevent' in query['sql']]
+        self.assertTrue(event_queries)
+        with connection.cursor() as cursor:
+            for sql in event_queries:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+                full_scans = [step for step in plan if step.startswith('SCAN api_analyticsevent')]
+                self.assertEqual(full_scans, [], f'{sql}\n{plan}')
+
+    def test_stats_uses_indexes(self):
+        for period in ('7d', '30d', '90d'):
+            self.assert_event_queries_use_indexes(f'/api/analytics/stats/?period={period}')
+
+    def test_exact_stats_uses_indexes(self):
+        self.assert_event_queries_use_indexes('/api/analytics/stats/?exact=true')
+
+    def test_events_listing_uses_indexes(self):
+        self.assert_event_queries_use_indexes('/api/analytics/events/?page_size=2')
+
+
+class ListQueryCountTests(TenantApiTestCase):
+    """Число запросов списков не должно зависеть от числа строк на странице"""
+
+    def add_rows(self, count):
+        for _ in range(count):
+            location, menu, category, _ = create_menu_tree(self.tenant)
+            item = Item.objects.create(tenant=self.tenant, category=category, name='Салат')
+            Price.objects.create(item=item, amount_minor=45000)
+            media = MediaAsset.objects.create(
+                tenant=self.tenant, type='video', original_url='https://example.com/salad.mp4'
+            )
+            ItemMedia.objects.create(item=item, media=media, kind='preview')
+            Category.objects.create(tenant=self.tenant, menu=menu, name='Десерты')
+            Menu.objects.create(tenant=self.tenant, location=location, name='Бар')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_list_query_count_is_constant(self):
+        for url in ('/api/locations/', '/api/menus/', '/api/categories/', '/api/items/'):
+            with self.subTest(url=url):
+                self.add_rows(2)
+                few, _ = self.count_queries(url)
+                self.add_rows(10)
+                many, data = self.count_queries(url)
+                self.assertGreater(len(data['results']), 10)
+                self.assertEqual(few, many)
+
+    def test_counts_come_from_annotations(self):
+        location, menu, category, _ = create_menu_tree(self.tenant)
+        Item.objects.create(tenant=self.tenant, category=category, name='Салат')
+
+        _, data = self.count_queries('/api/categories/')
+        self.assertEqual(data['results'][0]['items_count'], 2)
+        self.assertEqual(data['results'][0]['menu_name'], menu.name)
+        _, data = self.count_queries('/api/menus/')
+        self.assertEqual(data['results'][0]['categories_count'], 1)
+        self.assertEqual(data['results'][0]['location_name'], location.name)
+        _, data = self.count_queries('/api/locations/')
+        self.assertEqual(data['results'][0]['menus_count'], 1)
+
+
+class ResolvePeriodTests(SimpleTestCase):
+    """Разбор окна статистики из параметров запроса"""
+
+    def test_date_only_bounds_cover_whole_days(self):
+        start, end = resolve_period({'from': '2020-01-10', 'to': '2020-01-12'})
+        self.assertEqual(start, timezone.make_aware(datetime(2020, 1, 10)))
+        self.assertEqual(end, timezone.make_aware(datetime(2020, 1, 13)))
+
+    def test_datetime_bounds_are_kept(self):
+        start, end = resolve_period({'from': '2020-01-10T08:30:00', 'to': '2020-01-12T10:00:00'})
+        self.assertEqual(start, timezone.make_aware(datetime(2020, 1, 10, 8, 30)))
+        self.assertEqual(end, timezone.make_aware(datetime(2020, 1, 12, 10)))
+
+    def test_invalid_dates_raise_period_error(self):
+        for params in (
+            {'from': '2026-13-45'},
+            {'to': '2026-10-12T25:00'},
+            {'from': 'yesterday'},
+            {'from': '2020-01-12', 'to': '2020-01-10'},
+        ):
+            with self.subTest(params=params), self.assertRaises(PeriodError):
+                resolve_period(params)
+
+
+class AnalyticsPeriodApiTests(TenantApiTestCase):
+    def test_invalid_dates_return_400(self):
+        for url in ('/api/analytics/stats/', '/api/analytics/events/'):
+            for query in ('from=2026-13-45', 'to=2026-10-12T25:00'):
+                with self.subTest(url=url, query=query):
+                    response = self.client.get(f'{url}?{query}')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertFalse(response.json()['success'])
+
+
+class RollupCursorTests(TestCase):
+    """Курсор агрегатов не перескакивает событие с меньшим id и более поздним created_at"""
+
+    def test_stops_before_unsettled_event(self):
+        tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+        events = AnalyticsEvent.objects.bulk_create([
+            AnalyticsEvent(tenant=tenant, session_id=f's{n}', type='open_item') for n in range(3)
+        ])
+        settled = timezone.now() - timedelta(minutes=10)
+        AnalyticsEvent.objects.filter(pk__in=[events[0].pk, events[2].pk]).update(created_at=settled)
+
+        self.assertEqual(rollup_events(), 1)
+        self.assertEqual(get_cursor_position(), events[0].pk)
+
+        AnalyticsEvent.objects.filter(pk=events[1].pk).update(created_at=settled)
+        self.assertEqual(rollup_events(), 2)
+        self.assertEqual(get_cursor_position(), events[2].pk)
+        self.assertEqual(
+            sum(AnalyticsRollup.objects.filter(granularity='day').values_list('count', flat=True)), 3
+        )
+
+
+@override_settings(ANALYTICS_ROLLUP_SETTLE_SECONDS=-60)
+class UniqueSessionsTests(TestCase):
+    """Уникальные сессии считаются ровно за запрошенное окно"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+        cls.base = floor_day(timezone.now()) - timedelta(days=10)
+        events = []
+        for day in range(5):
+            for hour in (1, 12, 23):
+                moment = cls.base + timedelta(days=day, hours=hour)
+                for n in range(3):
+                    events.append(AnalyticsEvent(
+                        tenant=cls.tenant, session_id=f'd{day}h{hour}s{n}', type='open_item', timestamp=moment
+                    ))
+                events.append(AnalyticsEvent(
+                    tenant=cls.tenant, session_id='regular', type='open_item', timestamp=moment
+                ))
+        AnalyticsEvent.objects.bulk_create(events)
+
+    def expected(self, start, end):
+        return len(set(
+            AnalyticsEvent.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            .values_list('session_id', flat=True)
+        ))
+
+    def test_partial_days_are_not_widened(self):
+        rollup_events()
+        windows = [
+            (self.base + timedelta(days=1, hours=12), self.base + timedelta(days=3, hours=12)),
+            (self.base + timedelta(hours=11), self.base + timedelta(hours=13)),
+            (self.base + timedelta(days=1), self.base + timedelta(days=4)),
+        ]
+        for start, end in windows:
+            with self.subTest(start=start, end=end):
+                expected = self.expected(start, end)
+                self.assertEqual(exact_unique_sessions(self.tenant, start, end), expected)
+                self.assertAlmostEqual(approximate_unique_sessions(self.tenant, start, end), expected, delta=1)
+
+    def test_exact_uses_unrounded_window(self):
+        start = self.base + timedelta(days=1, hours=11, minutes=30)
+        end = self.base + timedelta(days=1, hours=12, minutes=30)
+        self.assertEqual(exact_unique_sessions(self.tenant, start, end), 4)
+
+
+@override_settings(ANALYTICS_ROLLUP_SETTLE_SECONDS=-60)
+class EventTotalsTests(TestCase):
+    """Просмотры и топ блюд считаются ровно за запрошенное окно, а не по полным часам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+        _, _, cls.category, cls.item = create_menu_tree(cls.tenant)
+        cls.base = floor_hour(timezone.now()) - timedelta(hours=10)
+        AnalyticsEvent.objects.bulk_create([
+            AnalyticsEvent(
+                tenant=cls.tenant, session_id=f's{minutes}', type='open_item',
+                category=cls.category, item=cls.item, timestamp=cls.base + timedelta(minutes=minutes),
+            )
+            for minutes in (5, 65, 70, 125, 185)
+        ])
+
+    def stats(self, start_minutes, end_minutes):
+        return compute_stats(
+            self.tenant,
+            self.base + timedelta(minutes=start_minutes),
+            self.base + timedelta(minutes=end_minutes),
+        )
+
+    def test_sub_hour_windows(self):
+        for rolled_up in (False, True):
+            if rolled_up:
+                rollup_events()
+            for (start, end), expected in {
+                (30, 45): 0,
+                (0, 10): 1,
+                (60, 68): 1,
+                (30, 130): 3,
+                (4, 186): 5,
+                (6, 184): 3,
+                (0, 240): 5,
+            }.items():
+                with self.subTest(rolled_up=rolled_up, start=start, end=end):
+                    stats = self.stats(start, end)
+                    self.assertEqual(stats['total_views'], expected)
+                    self.assertEqual(len(stats['top_items']), 1 if expected else 0)
+                    if expected:
+                        self.assertEqual(stats['top_items'][0].interactions_count, expected)
+
+
+class MissingMetadataTests(TestCase):
+    """probe_media не должен заново проверять ассеты с полными метаданными их типа"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+        url = 'http://localhost:8000/media/uploads/a.bin'
+        cls.image_done = MediaAsset.objects.create(
+            tenant=cls.tenant, type='image', original_url=url, file_size=10, width=100, height=50
+        )
+        cls.image_missing = MediaAsset.objects.create(
+            tenant=cls.tenant, type='image', original_url=url, file_size=10
+        )
+        cls.video_done = MediaAsset.objects.create(
+            tenant=cls.tenant, type='video', original_url=url, file_size=10, duration_seconds=5
+        )
+        cls.video_no_duration = MediaAsset.objects.create(
+            tenant=cls.tenant, type='video', original_url=url, file_size=10
+        )
+        cls.audio_missing = MediaAsset.objects.create(tenant=cls.tenant, type='audio', original_url=url)
+
+    def missing(self):
+        return set(MediaAsset.objects.filter(missing_metadata_q()).values_list('id', flat=True))
+
+    @override_settings(FFPROBE_BINARY='true')
+    def test_with_ffprobe(self):
+        self.assertEqual(
+            self.missing(), {self.image_missing.id, self.video_no_duration.id, self.audio_missing.id}
+        )
+
+    @override_settings(FFPROBE_BINARY='ffprobe-not-installed')
+    def test_without_ffprobe(self):
+        self.assertEqual(self.missing(), {self.image_missing.id, self.audio_missing.id})
+
+
+class ReorderTests(TenantApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.menu, cls.category, cls.item = create_menu_tree(cls.tenant)
+        cls.second = Item.objects.create(tenant=cls.tenant, category=cls.category, name='Салат')
+
+    def test_reorders_items(self):
+        response = self.client.post('/api/items/reorder/', {
+            'category': self.category.id, 'ids': [self.second.id, self.item.id]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Item.objects.filter(category=self.category).order_by('sort').values_list('id', flat=True)),
+            [self.second.id, self.item.id]
+        )
+
+    def test_invalid_input_returns_field_errors(self):
+        cases = [
+            ('/api/items/reorder/', {'category': 'abc', 'ids': [self.item.id]}, 'category'),
+            ('/api/items/reorder/', {'category': self.category.id, 'ids': ['x']}, 'ids'),
+            ('/api/items/reorder/', {'category': self.category.id, 'ids': []}, 'ids'),
+            ('/api/items/reorder/', {'category': self.category.id, 'ids': [self.item.id, self.item.id]}, 'ids'),
+            ('/api/categories/reorder/', {'ids': [self.category.id]}, 'menu'),
+        ]
+        for url, data, field in cases:
+            with self.subTest(data=data):
+                response = self.client.post(url, data, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json()['error'])
+
+    def test_foreign_ids_are_rejected(self):
+        other = Item.objects.create(tenant=self.tenant, category=create_menu_tree(self.tenant)[2], name='Суп')
+        response = self.client.post('/api/items/reorder/', {
+            'category': self.category.id, 'ids': [self.item.id, other.id]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class MenuRoundTripTests(TenantApiTestCase):
+    """Экспорт меню и импорт того же файла ничего не меняют"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.menu, category, item = create_menu_tree(cls.tenant)
+        item.sku = 'steak'
+        item.tags = ['мясо', 'гриль']
+        item.weight_g = 300
+        item.save()
+        Item.objects.create(tenant=cls.tenant, category=category, name='Салат', sort=1)
+        Price.objects.create(item=item, amount_minor=150000, currency='RUB')
+        Price.objects.create(item=item, amount_minor=2000, currency='USD')
+        for sort, (kind, media_type) in enumerate([('sound', 'audio'), ('preview', 'video'), ('full', 'video')]):
+            media = MediaAsset.objects.create(
+                tenant=cls.tenant, type=media_type, original_url=f'https://example.com/{kind}.mp4'
+            )
+            ItemMedia.objects.create(item=item, media=media, kind=kind, sort=sort)
+
+    def snapshot(self):
+        return (
+            list(Category.objects.order_by('id').values_list('id', 'name', 'sort')),
+            list(Item.objects.order_by('id').values_list(
+                'id', 'category_id', 'sku', 'name', 'description', 'tags', 'allergens',
+                'nutrition_values_json', 'weight_g', 'kcal', 'sort',
+            )),
+            list(Price.objects.order_by('id').values_list('id', 'item_id', 'amount_minor', 'currency')),
+            list(ItemMedia.objects.order_by('id').values_list('id', 'item_id', 'media_id', 'kind', 'sort')),
+            MediaAsset.objects.count(),
+        )
+
+    def test_export_then_import_changes_nothing(self):
+        for fmt in ('json', 'csv'):
+            with self.subTest(fmt=fmt):
+                before = self.snapshot()
+                response = self.client.get(f'/api/menus/{self.menu.id}/export/?fmt={fmt}')
+                self.assertEqual(response.status_code, 200)
+                content = b''.join(response.streaming_content)
+
+                response = self.client.post(f'/api/menus/{self.menu.id}/import/', {
+                    'file': SimpleUploadedFile(f'menu.{fmt}', content),
+                })
+                self.assertEqual(response.status_code, 200)
+                changes = {key: value for key, value in response.json().items() if key != 'success' and value}
+                self.assertEqual(changes, {})
+                self.assertEqual(self.snapshot(), before)
+
+
+class KeysetPaginationTests(TenantApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, _, cls.category, first = create_menu_tree(cls.tenant)
+        # Одинаковые sort: порядок внутри них задаёт id
+        cls.items = [first] + [
+            Item.objects.create(tenant=cls.tenant, category=cls.category, name=f'Блюдо {n}', sort=n // 3)
+            for n in range(6)
+        ]
+        cls.expected = list(
+            Item.objects.filter(category=cls.category).order_by('sort', 'id').values_list('id', flat=True)
+        )
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_forward_and_backward_paging(self):
+        pages = []
+        page = self.get(f'/api/items/?category={self.category.id}&page_size=2')
+        self.assertIsNone(page['previous'])
+        pages.append([row['id'] for row in page['results']])
+        while page['next']:
+            page = self.get(page['next'])
+            pages.append([row['id'] for row in page['results']])
+        self.assertEqual([pk for rows in pages for pk in rows], self.expected)
+        self.assertEqual([len(rows) for rows in pages], [2, 2, 2, 1])
+
+        backward = [[row['id'] for row in page['results']]]
+        while page['previous']:
+            page = self.get(page['previous'])
+            backward.append([row['id'] for row in page['results']])
+        self.assertEqual(backward, pages[::-1])
+
+    def test_count_only_on_request(self):
+        url = f'/api/items/?category={self.category.id}&page_size=2'
+        self.assertNotIn('count', self.get(url))
+        self.assertEqual(self.get(url + '&count=true')['count'], len(self.expected))
+
+    def test_bad_cursor_returns_404(self):
+        def cursor(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for url in ('/api/items/', '/api/analytics/events/'):
+            for value in ('not-base64!', cursor({'k': ['x', 1]}), cursor({'k': ['garbage', 1]}),
+                          cursor({'k': [None, 1]}), cursor({'k': [1]}), cursor({'r': 1})):
+                with self.subTest(url=url, cursor=value):
+                    self.assertEqual(self.client.get(url, {'cursor': value}).status_code, 404)
+
+
+class QRCodeBulkTests(TempMediaRootMixin, TenantApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.location = Location.objects.create(tenant=cls.tenant, name='Зал')
+
+    def bulk(self, **data):
+        return self.client.post('/api/qr-codes/bulk/', {
+            'location': self.location.id, 'url': 'https://example.com/menu', **data
+        }, format='json')
+
+    def test_creates_codes_and_zip(self):
+        response = self.bulk(table_from=3, table_to=5, fmt='svg')
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['table-003.svg', 'table-004.svg', 'table-005.svg'])
+        self.assertIn(b'<svg', archive.read('table-003.svg'))
+
+        codes = QRCode.objects.filter(location=self.location).order_by('id')
+        self.assertEqual(
+            [(code.name, code.url) for code in codes],
+            [(f'Стол {table}', f'https://example.com/menu?table={table}') for table in (3, 4, 5)],
+        )
+        self.assertTrue(all(code.qr_code_url.endswith('.png') for code in codes))
+
+    def test_invalid_parameters_return_400(self):
+        for data in (
+            {'location': 'abc', 'table_to': 3},
+            {'location': None, 'table_to': 3},
+            {'table_from': 'x', 'table_to': 3},
+            {'table_from': 5, 'table_to': 3},
+            {'location': self.location.id + 100, 'table_to': 3},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.bulk(**data).status_code, 400)
+        self.assertFalse(QRCode.objects.exists())
+
+
+class PackageAssetTests(TempMediaRootMixin, TestCase):
+    """package_asset не хеширует исходник заново, пока файл не менялся"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+
+    def add_video(self, relative, content=b'video', **fields):
+        path = Path(self.media_root) / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return path, MediaAsset.objects.create(
+            tenant=self.tenant, type='video', original_url=media_file_url(relative), **fields
+        )
+
+    def package(self, asset):
+        with mock.patch('api.hls.file_sha256', side_effect=file_sha256) as hashed, \
+                mock.patch('api.hls.package_hls', side_effect=lambda path, digest: f'hls/{digest}/master.m3u8'):
+            result = package_asset(asset)
+        return result, hashed.call_count
+
+    def test_stat_skips_hashing(self):
+        path, asset = self.add_video('videos/steak.mp4')
+        self.assertEqual(self.package(asset), ('packaged', 1))
+        self.assertEqual(self.package(asset), ('unchanged', 0))
+
+        # Тот же файл с новым mtime хешируется, но не перепаковывается
+        os.utime(path, ns=(0, 10 ** 9))
+        self.assertEqual(self.package(asset), ('unchanged', 1))
+        self.assertEqual(self.package(asset), ('unchanged', 0))
+
+        path.write_bytes(b'another video')
+        self.assertEqual(self.package(asset), ('packaged', 1))
+        self.assertEqual(asset.hls_source_hash, file_sha256(path))
+
+    def test_uploads_use_content_hash(self):
+        content_hash = '0a' * 32
+        _, asset = self.add_video(f'uploads/0a/{content_hash}.mp4', content_hash=content_hash)
+        self.assertEqual(self.package(asset), ('packaged', 0))
+        self.assertEqual(asset.hls_source_hash, content_hash)
+        self.assertEqual(self.package(asset), ('unchanged', 0))
+
+
+class ServeMediaTests(TempMediaRootMixin, SimpleTestCase):
+    """Range, If-Range и условные запросы при отдаче файлов из MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(100))
+        Path(self.media_root, 'clip.mp4').write_bytes(self.content)
+        self.client = Client()
+        self.url = '/media/clip.mp4'
+        self.etag = self.client.head(self.url)['ETag']
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], '100')
+
+    def test_ranges(self):
+        for header, start, end in (
+            ('bytes=10-19', 10, 19),
+            ('bytes=90-', 90, 99),
+            ('bytes=95-200', 95, 99),
+            ('bytes=-5', 95, 99),
+            ('bytes=-500', 0, 99),
+        ):
+            with self.subTest(range=header):
+                response, body = self.get(range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(body, self.content[start:end + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/100')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+    def test_unsupported_range_returns_whole_file(self):
+        for header in ('bytes=0-1,5-6', 'items=0-1', 'bytes=20-10'):
+            with self.subTest(range=header):
+                response, body = self.get(range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, self.content)
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.subTest(range=header):
+                response, _ = self.get(range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range(self):
+        response, body = self.get(range='bytes=0-9', if_range=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[:10])
+
+        response, body = self.get(range='bytes=0-9', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+    def test_if_none_match(self):
+        response, body = self.get(if_none_match=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+
+    def test_head(self):
+        response = self.client.head(self.url, headers={'range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response.content, b'')
+
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '100')
+
+    def test_missing_and_traversal_return_404(self):
+        # Файл рядом с MEDIA_ROOT, а не внутри него
+        inner = Path(self.media_root) / 'inner'
+        inner.mkdir()
+        Path(self.media_root, 'secret.txt').write_text('secret')
+        with override_settings(MEDIA_ROOT=str(inner)):
+            for url in ('/media/missing.mp4', '/media/../secret.txt', '/media/%2e%2e/secret.txt', '/media/'):
+                with self.subTest(url=url):
+                    self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        response, body = self.get(range='bytes=0-9')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/clip.mp4')
+        self.assertEqual(body, b'')
+
+
+class UploadSessionTests(TempMediaRootMixin, TenantApiTestCase):
+    """Загрузка по частям: смещения, контрольная сумма и повторное завершение"""
+
+    content = b'0123456789' * 3
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(UPLOAD_SESSION_ROOT=os.path.join(self.media_root, 'sessions')))
+
+    def start(self, content=None, **data):
+        content = self.content if content is None else content
+        response = self.client.post('/api/uploads/', {
+            'filename': 'dish.mp4', 'size': len(content), **data
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, session_id, offset, data):
+        return self.client.put(
+            f'/api/uploads/{session_id}/chunk/', data,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, session_id, content=None):
+        content = self.content if content is None else content
+        for offset in range(0, len(content), 10):
+            self.assertEqual(self.put(session_id, offset, content[offset:offset + 10]).status_code, 200)
+
+    def complete(self, session_id, **data):
+        return self.client.post(f'/api/uploads/{session_id}/complete/', data, format='json')
+
+    def test_offsets_must_follow_received_bytes(self):
+        session_id = self.start()
+        response = self.put(session_id, 10, self.content[10:20])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received_bytes'], 0)
+
+        self.assertEqual(self.put(session_id, 0, self.content[:10]).status_code, 200)
+        # Повтор уже принятой части не дописывает её второй раз
+        response = self.put(session_id, 0, self.content[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received_bytes'], 10)
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 409)
+
+        self.put(session_id, 10, self.content[10:20])
+        self.put(session_id, 20, self.content[20:])
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['file_size'], len(self.content))
+        path = Path(self.media_root) / 'uploads'
+        self.assertEqual([file.read_bytes() for file in path.rglob('*.mp4')], [self.content])
+
+    def test_checksum_mismatch_restarts_upload(self):
+        session_id = self.start(sha256='f' * 64)
+        self.upload(session_id)
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['received_bytes'], 0)
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual((session.status, session.received_bytes), ('active', 0))
+        self.assertFalse(MediaAsset.objects.exists())
+
+        self.upload(session_id)
+        response = self.complete(session_id, sha256=hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.status_code, 201)
+
+    def test_repeated_complete_returns_same_asset(self):
+        session_id = self.start()
+        self.upload(session_id)
+        first = self.complete(session_id)
+        self.assertEqual(first.status_code, 201)
+        second = self.complete(session_id)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(MediaAsset.objects.count(), 1)
+
+    def test_completing_session_returns_409(self):
+        session_id = self.start()
+        self.upload(session_id)
+        UploadSession.objects.filter(pk=session_id).update(status='completing')
+        self.assertEqual(self.complete(session_id).status_code, 409)
+
+    def test_same_content_is_deduplicated(self):
+        first_id = self.start()
+        self.upload(first_id)
+        first = self.complete(first_id).json()
+
+        second_id = self.start()
+        self.upload(second_id)
+        response = self.complete(second_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], first['id'])
+        self.assertTrue(response.json()['deduplicated'])
+        self.assertEqual(MediaAsset.objects.count(), 1)
+        self.assertEqual(len(list((Path(self.media_root) / 'uploads').rglob('*.mp4'))), 1)
+
+
+class PublicMenuSnapshotTests(TenantApiTestCase):
+    """Снапшот публичного меню собирается один раз и сбрасывается при изменениях"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, _, cls.category, cls.item = create_menu_tree(cls.tenant)
+        cls.price = Price.objects.create(item=cls.item, amount_minor=150000)
+        cls.media = MediaAsset.objects.create(
+            tenant=cls.tenant, type='video', original_url='https://example.com/steak.mp4'
+        )
+        cls.url = f'/api/public/menu/{cls.tenant.slug}/'
+
+    def get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def version(self):
+        return Tenant.objects.values_list('menu_version', flat=True).get(pk=self.tenant.pk)
+
+    def test_second_request_reads_snapshot(self):
+        first = self.get()
+        with self.assertNumQueries(1):
+            second = self.get()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_changes_invalidate_snapshot(self):
+        for change in (
+            lambda: Price.objects.filter(pk=self.price.pk).first().save(),
+            lambda: ItemMedia.objects.create(item=self.item, media=self.media, kind='preview'),
+            lambda: ItemMedia.objects.filter(item=self.item).first().save(),
+            lambda: Price.objects.filter(pk=self.price.pk).delete(),
+        ):
+            etag = self.get()['ETag']
+            change()
+            response = self.get()
+            self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['menus'][0]['categories'][0]['items'][0]['prices'], [])
+
+    def test_bulk_changes_bump_version_once(self):
+        version = self.version()
+        with single_menu_bump(self.tenant.pk):
+            for n in range(3):
+                Item.objects.create(tenant=self.tenant, category=self.category, name=f'Блюдо {n}')
+            Price.objects.create(item=self.item, amount_minor=1000, currency='USD')
+        self.assertEqual(self.version(), version + 1)
+
+        ids = list(Item.objects.filter(category=self.category).order_by('-id').values_list('id', flat=True))
+        response = self.client.post('/api/items/reorder/', {'category': self.category.id, 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.version(), version + 2)
+
+    def test_if_none_match_returns_304(self):
+        first = self.get()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        Price.objects.filter(pk=self.price.pk).first().save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+class AnalyticsBufferTests(TestCase):
+    """Синхронная запись и переполнение буфера событий"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Ресторан', slug='restaurant')
+
+    def events(self, count):
+        return [AnalyticsEvent(tenant=self.tenant, session_id=f's{n}', type='open_item') for n in range(count)]
+
+    def buffer(self, overflow):
+        # Фоновый поток за время теста не сбрасывает буфер: всё пишет stop()
+        buffer = AnalyticsBuffer(max_events=2, flush_events=100, flush_interval=60, overflow=overflow)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    @override_settings(ANALYTICS_BUFFER={'ENABLED': False})
+    def test_synchronous_mode_writes_immediately(self):
+        self.assertFalse(record_events(self.events(3)))
+        self.assertEqual(AnalyticsEvent.objects.count(), 3)
+
+    def test_drop_overflow(self):
+        buffer = self.buffer('drop')
+        with self.assertLogs('api.analytics', 'WARNING') as logs:
+            self.assertEqual(buffer.enqueue(self.events(3)), 2)
+        self.assertIn('отброшено 1', logs.output[0])
+        self.assertEqual(AnalyticsEvent.objects.count(), 0)
+
+        with self.assertLogs('api.analytics', 'WARNING') as logs:
+            buffer.stop()
+        self.assertIn("'dropped': 1", logs.output[0])
+        self.assertEqual(AnalyticsEvent.objects.count(), 2)
+        self.assertEqual(
+            {key: buffer.stats()[key] for key in ('enqueued', 'written', 'dropped', 'pending')},
+            {'enqueued': 2, 'written': 2, 'dropped': 1, 'pending': 0},
+        )
+
+    def test_block_overflow(self):
+        buffer = self.buffer('block')
+        with self.assertLogs('api.analytics', 'WARNING'):
+            self.assertEqual(buffer.enqueue(self.events(3)), 3)
+        # Переполнение сбросило первые два события в потоке запроса
+        self.assertEqual(AnalyticsEvent.objects.count(), 2)
+        buffer.stop()
+        self.assertEqual(AnalyticsEvent.objects.count(), 3)
+        stats = buffer.stats()
+        self.assertEqual((stats['backpressure'], stats['dropped'], stats['written']), (1, 0, 3))
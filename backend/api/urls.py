@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     LocationViewSet, MenuViewSet, CategoryViewSet, ItemViewSet,
-    UserViewSet, QRCodeViewSet, AnalyticsViewSet, CustomAuthToken,
+    UserViewSet, QRCodeViewSet, PriceViewSet, MediaAssetViewSet, UploadSessionViewSet,
+    AnalyticsViewSet, CustomAuthToken,
     public_menu_view
 )
 
@@ -13,6 +14,9 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'items', ItemViewSet)
 router.register(r'users', UserViewSet)
 router.register(r'qr-codes', QRCodeViewSet)
+router.register(r'prices', PriceViewSet, basename='prices')
+router.register(r'media', MediaAssetViewSet)
+router.register(r'uploads', UploadSessionViewSet, basename='uploads')
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
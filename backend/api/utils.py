@@ -0,0 +1,46 @@
+"""Общие вспомогательные функции для файлов и пулов потоков"""
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path):
+    """Файл для записи, который появляется по path только целиком.
+
+    Запись идёт во временный файл в том же каталоге, затем он
+    переименовывается: параллельные читатели не увидят недописанный файл.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            yield tmp
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class LazyExecutor:
+    """Пул, который создаётся factory при первом обращении.
+
+    Настройки пула читаются в момент создания, а процессы, не ставящие
+    задач, пул не создают вовсе.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._factory()
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.get().submit(fn, *args, **kwargs)
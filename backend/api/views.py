@@ -1,19 +1,39 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from pathlib import Path
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.db.models import Count, Q
 from django.utils import timezone
-from datetime import timedelta
 from .models import (
     User, Tenant, Location, Menu, Category, Item, Price, 
-    MediaAsset, ItemMedia, AnalyticsEvent, QRCode
+    MediaAsset, ItemMedia, UploadSession, AnalyticsEvent, QRCode
 )
 from .serializers import (
     TenantSerializer, LocationSerializer, MenuSerializer, CategorySerializer,
     ItemSerializer, UserSerializer, AnalyticsEventSerializer, QRCodeSerializer,
-    DashboardStatsSerializer
+    MediaAssetSerializer, UploadSessionSerializer,
+    PriceBatchUpdateSerializer, CategoryReorderSerializer, ItemReorderSerializer
+)
+from .analytics import prepare_events, record_events
+from .pagination import SortKeysetPagination, EventKeysetPagination
+from .dashboard import get_cached_stats, resolve_period, PeriodError
+from .media import (
+    MEDIA_TYPES, media_type_for, store_upload, store_media_file, upload_extension,
+    upload_session_path, write_upload_chunk, file_sha256,
+)
+from .menu_ops import clone_menu, batch_update_prices, reorder
+from .menu_io import (
+    import_menu, parse_import, export_menu_csv, export_menu_json, MenuImportError,
+    FORMATS as MENU_FORMATS,
+)
+from .qr import (
+    ensure_qr_image, ensure_qr_images, normalize_options, stream_zip, table_url,
+    FORMATS as QR_FORMATS, media_url as qr_media_url,
 )
 
 
@@ -23,7 +43,9 @@ class LocationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Location.objects.filter(tenant=self.request.user.tenant)
+        return Location.objects.filter(tenant=self.request.user.tenant).annotate(
+            menus_count=Count('menus')
+        ).order_by('id')
     
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.tenant)
@@ -35,7 +57,11 @@ class MenuViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Menu.objects.filter(tenant=self.request.user.tenant)
+        queryset = Menu.objects.filter(tenant=self.request.user.tenant).select_related(
+            'location'
+        ).annotate(
+            categories_count=Count('categories')
+        ).order_by('id')
         # Фильтрация по локации если указана
         location_id = self.request.query_params.get('location')
         if location_id:
@@ -44,15 +70,134 @@ class MenuViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.tenant)
+    
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Копия меню со всем деревом в одну или несколько локаций
+        
+        Параметры: locations (список id, по умолчанию локация исходного
+        меню), name, share_media (по умолчанию true — копии используют те же
+        медиа файлы).
+        """
+        menu = self.get_object()
+        location_ids = request.data.get('locations') or [menu.location_id]
+        if not isinstance(location_ids, list):
+            location_ids = [location_ids]
+        try:
+            location_ids = [int(location_id) for location_id in location_ids]
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'error': 'Некорректный список локаций'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        locations = Location.objects.filter(tenant=request.user.tenant).in_bulk(location_ids)
+        missing = [location_id for location_id in location_ids if location_id not in locations]
+        if missing:
+            return Response({
+                'success': False,
+                'error': f'Локации не найдены: {", ".join(map(str, missing))}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        share_media = request.data.get('share_media', True) not in (False, 'false', '0', 0)
+        menus = clone_menu(
+            menu,
+            [locations[location_id] for location_id in location_ids],
+            name=request.data.get('name') or None,
+            share_media=share_media,
+        )
+        return Response({
+            'success': True,
+            'menus': self.get_serializer(menus, many=True).data
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'], url_path='import')
+    def import_menu(self, request, pk=None):
+        """Импорт категорий, блюд, цен и медиа из JSON или CSV
+        
+        Файл передаётся в поле file (формат по расширению или параметру fmt)
+        либо JSON-телом запроса. Всё применяется одной транзакцией.
+        """
+        menu = self.get_object()
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file is not None:
+            fmt = request.data.get('fmt') or Path(uploaded_file.name).suffix.lstrip('.').lower()
+            content = uploaded_file.read()
+        else:
+            fmt = 'json'
+            content = request.data
+        if fmt not in MENU_FORMATS:
+            return Response({
+                'success': False,
+                'error': 'Поддерживаются форматы json и csv'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            categories = parse_import(content, fmt)
+        except MenuImportError as e:
+            return Response({
+                'success': False,
+                'error': e.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({
+                'success': False,
+                'error': 'Файл должен быть в кодировке UTF-8'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'success': True, **import_menu(menu, categories, partial=fmt == 'csv')})
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Выгрузка меню в формате импорта, параметр fmt=json|csv"""
+        menu = self.get_object()
+        fmt = request.query_params.get('fmt', 'json')
+        if fmt not in MENU_FORMATS:
+            return Response({
+                'success': False,
+                'error': 'Поддерживаются форматы json и csv'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        content = export_menu_csv(menu) if fmt == 'csv' else export_menu_json(menu)
+        response = StreamingHttpResponse(content, content_type=f'{MENU_FORMATS[fmt]}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="menu-{menu.pk}.{fmt}"'
+        return response
+
+
+def _reorder_response(request, serializer_class, model, parent_field):
+    """Ответ reorder-действий: родитель parent_field и ids в нужном порядке"""
+    serializer = serializer_class(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'error': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    tenant = request.user.tenant
+    data = serializer.validated_data
+    queryset = model.objects.filter(tenant=tenant, **{f'{parent_field}_id': data[parent_field]})
+    try:
+        updated = reorder(queryset, data['ids'], tenant.pk)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'success': True, 'updated': updated})
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SortKeysetPagination
     
     def get_queryset(self):
-        queryset = Category.objects.filter(tenant=self.request.user.tenant)
+        queryset = Category.objects.filter(tenant=self.request.user.tenant).select_related(
+            'menu'
+        ).annotate(
+            items_count=Count('items')
+        )
         # Фильтрация по меню если указано
         menu_id = self.request.query_params.get('menu')
         if menu_id:
@@ -65,15 +210,21 @@ class CategoryViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.tenant)
+    
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """Порядок категорий меню: menu и ids в нужном порядке"""
+        return _reorder_response(request, CategoryReorderSerializer, Category, 'menu')
 
 
 class ItemViewSet(viewsets.ModelViewSet):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SortKeysetPagination
     
     def get_queryset(self):
-        queryset = Item.objects.filter(tenant=self.request.user.tenant)
+        queryset = Item.objects.with_related().filter(tenant=self.request.user.tenant)
         # Фильтрация по категории если указана
         category_id = self.request.query_params.get('category')
         if category_id:
@@ -90,6 +241,11 @@ class ItemViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.tenant)
+    
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """Порядок блюд категории: category и ids в нужном порядке"""
+        return _reorder_response(request, ItemReorderSerializer, Item, 'category')
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -112,11 +268,350 @@ class QRCodeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return QRCode.objects.filter(tenant=self.request.user.tenant)
     
+    def _render_qr_code_url(self, url):
+        # QR код рендерится локально и кэшируется по содержимому в MEDIA_ROOT
+        options = normalize_options()
+        relative = ensure_qr_image(url, **options)
+        return self.request.build_absolute_uri(qr_media_url(relative))
+    
     def perform_create(self, serializer):
-        # Генерируем QR код URL (пока просто используем Google Charts API)
         url = serializer.validated_data.get('url', '')
-        qr_code_url = f"https://chart.googleapis.com/chart?chs=200x200&chld=M|0&cht=qr&chl={url}"
-        serializer.save(tenant=self.request.user.tenant, qr_code_url=qr_code_url)
+        serializer.save(tenant=self.request.user.tenant, qr_code_url=self._render_qr_code_url(url))
+    
+    def perform_update(self, serializer):
+        url = serializer.validated_data.get('url', serializer.instance.url)
+        serializer.save(qr_code_url=self._render_qr_code_url(url))
+    
+    @action(detail=True, methods=['get'])
+    def image(self, request, pk=None):
+        """Изображение QR кода: параметры fmt (png|svg), size, error (L|M|Q|H), border"""
+        qr_code = self.get_object()
+        params = request.query_params
+        try:
+            options = normalize_options(
+                fmt=params.get('fmt'),
+                size=params.get('size'),
+                error_level=params.get('error'),
+                border=params.get('border'),
+            )
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        relative = ensure_qr_image(qr_code.url, **options)
+        response = FileResponse(
+            open(Path(settings.MEDIA_ROOT) / relative, 'rb'),
+            content_type=QR_FORMATS[options['fmt']],
+        )
+        patch_cache_control(response, public=True, max_age=60 * 60 * 24)
+        return response
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Массовое создание QR кодов для столов локации, ответ — ZIP архив
+        
+        Параметры: location, table_from, table_to, url (адрес меню, к нему
+        добавляется ?table=N), а также fmt, size, error, border.
+        """
+        data = request.data
+        tenant = request.user.tenant
+        try:
+            location_id = int(data.get('location'))
+            table_from = int(data.get('table_from', 1))
+            table_to = int(data.get('table_to'))
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'error': 'Укажите локацию location и диапазон столов table_from и table_to'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if table_from < 1 or table_to < table_from:
+            return Response({
+                'success': False,
+                'error': 'Некорректный диапазон столов'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if table_to - table_from + 1 > settings.QR_BULK_MAX_TABLES:
+            return Response({
+                'success': False,
+                'error': f'Не более {settings.QR_BULK_MAX_TABLES} столов за запрос'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        location = Location.objects.filter(tenant=tenant, pk=location_id).first()
+        if location is None:
+            return Response({
+                'success': False,
+                'error': 'Локация не найдена'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        url_field = serializers.URLField()
+        try:
+            base_url = url_field.run_validation(data.get('url'))
+            options = normalize_options(
+                fmt=data.get('fmt'),
+                size=data.get('size'),
+                error_level=data.get('error'),
+                border=data.get('border'),
+            )
+        except serializers.ValidationError as e:
+            return Response({
+                'success': False,
+                'error': {'url': e.detail}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        tables = range(table_from, table_to + 1)
+        urls = [table_url(base_url, table) for table in tables]
+        # Рендеринг идёт в пуле процессов до записи в базу, чтобы не держать
+        # блокировку записи SQLite на время генерации картинок
+        paths = ensure_qr_images(urls, options)
+        png_paths = paths if options['fmt'] == 'png' else ensure_qr_images(urls, normalize_options())
+        QRCode.objects.bulk_create([
+            QRCode(
+                tenant=tenant,
+                location=location,
+                name=f'Стол {table}',
+                url=url,
+                qr_code_url=request.build_absolute_uri(qr_media_url(relative)),
+            )
+            for table, url, relative in zip(tables, urls, png_paths)
+        ])
+        
+        media_root = Path(settings.MEDIA_ROOT)
+        files = [
+            (f'table-{table:03d}.{options["fmt"]}', media_root / relative)
+            for table, relative in zip(tables, paths)
+        ]
+        response = StreamingHttpResponse(stream_zip(files), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="qr-location-{location.pk}.zip"'
+        return response
+
+
+class PriceViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    
+    @action(detail=False, methods=['post'], url_path='batch-update')
+    def batch_update(self, request):
+        """Массовое изменение цен
+        
+        Фильтры: menu, category, location, tag, currency. Правило rule
+        ({type: percent|absolute, value}) и/или location_rules для отдельных
+        локаций, округление round_to (в копейках). С dry_run=true только
+        возвращает список изменений.
+        """
+        serializer = PriceBatchUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'error': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        options = serializer.validated_data
+        changes = batch_update_prices(request.user.tenant, options)
+        return Response({
+            'success': True,
+            'dry_run': options['dry_run'],
+            'changed': len(changes),
+            'changes': changes,
+        })
+
+
+class MediaAssetViewSet(viewsets.ModelViewSet):
+    queryset = MediaAsset.objects.all()
+    serializer_class = MediaAssetSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return MediaAsset.objects.filter(tenant=self.request.user.tenant).order_by('id')
+    
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.tenant)
+    
+    @action(detail=False, methods=['post'])
+    def upload(self, request):
+        """Загрузка файла (поле file, необязательное поле type)
+        
+        Если у тенанта уже есть ассет с тем же содержимым, возвращается он.
+        """
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file is None:
+            return Response({
+                'success': False,
+                'error': 'Файл не передан'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        media_type = request.data.get('type') or media_type_for(uploaded_file.content_type)
+        if media_type not in MEDIA_TYPES:
+            return Response({
+                'success': False,
+                'error': 'Поддерживаются только изображения, видео и аудио'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        asset, created = store_upload(request.user.tenant, uploaded_file, media_type)
+        return Response(
+            {**self.get_serializer(asset).data, 'deduplicated': not created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class UploadSessionViewSet(viewsets.ViewSet):
+    """Загрузка больших файлов по частям с докачкой
+    
+    POST /uploads/ (filename, size, sha256, type) открывает загрузку,
+    PUT /uploads/<id>/chunk/ с заголовком Upload-Offset дописывает часть,
+    GET /uploads/<id>/ возвращает принятое смещение для продолжения,
+    POST /uploads/<id>/complete/ проверяет хеш и создаёт MediaAsset.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_session(self, pk):
+        return UploadSession.objects.filter(tenant=self.request.user.tenant, pk=pk).first()
+    
+    def not_found(self):
+        return Response({
+            'success': False,
+            'error': 'Загрузка не найдена'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    def create(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'error': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        session = serializer.save(tenant=request.user.tenant)
+        path = upload_session_path(session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        return Response(
+            {**UploadSessionSerializer(session).data, 'chunk_size': settings.MEDIA_UPLOAD_CHUNK_BYTES},
+            status=status.HTTP_201_CREATED,
+        )
+    
+    def retrieve(self, request, pk=None):
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found()
+        return Response(UploadSessionSerializer(session).data)
+    
+    def destroy(self, request, pk=None):
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found()
+        upload_session_path(session).unlink(missing_ok=True)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Часть файла в теле запроса, смещение — в заголовке Upload-Offset"""
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found()
+        if session.status != 'active':
+            return Response({
+                'success': False,
+                'error': 'Загрузка уже завершена'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return Response({
+                'success': False,
+                'error': 'Укажите смещение в заголовке Upload-Offset'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.MEDIA_UPLOAD_CHUNK_BYTES:
+            return Response({
+                'success': False,
+                'error': f'Часть не должна превышать {settings.MEDIA_UPLOAD_CHUNK_BYTES} байт'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        # Части принимаются только подряд: клиент продолжает с received_bytes
+        if offset != session.received_bytes:
+            return Response({
+                'success': False,
+                'error': 'Смещение не совпадает с принятым',
+                'received_bytes': session.received_bytes,
+            }, status=status.HTTP_409_CONFLICT)
+        
+        # Тело читается из потока напрямую, минуя парсеры DRF
+        written = write_upload_chunk(session, offset, request.stream)
+        updated = UploadSession.objects.filter(
+            pk=session.pk, received_bytes=offset, status='active'
+        ).update(received_bytes=offset + written, updated_at=timezone.now())
+        if not updated:
+            session.refresh_from_db()
+            return Response({
+                'success': False,
+                'error': 'Часть с этим смещением уже принята',
+                'received_bytes': session.received_bytes,
+            }, status=status.HTTP_409_CONFLICT)
+        return Response({'success': True, 'received_bytes': offset + written, 'size': session.size})
+    
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Проверка размера и SHA-256, создание MediaAsset"""
+        session = self.get_session(pk)
+        if session is None:
+            return self.not_found()
+        if session.received_bytes != session.size and session.status == 'active':
+            return Response({
+                'success': False,
+                'error': 'Файл загружен не полностью',
+                'received_bytes': session.received_bytes,
+            }, status=status.HTTP_409_CONFLICT)
+        
+        # Завершение захватывается атомарно: повторный запрос клиента,
+        # пришедший во время проверки, не должен трогать тот же файл
+        claimed = UploadSession.objects.filter(
+            pk=session.pk, status='active', received_bytes=session.size
+        ).update(status='completing', updated_at=timezone.now())
+        if not claimed:
+            session.refresh_from_db()
+            if session.status == 'completed' and session.media is not None:
+                return Response({**MediaAssetSerializer(session.media).data, 'deduplicated': False})
+            return Response({
+                'success': False,
+                'error': 'Загрузка уже завершается' if session.status == 'completing' else 'Загрузка уже завершена',
+            }, status=status.HTTP_409_CONFLICT)
+        
+        path = upload_session_path(session)
+        try:
+            content_hash = file_sha256(path)
+            expected = (request.data.get('sha256') or session.sha256).lower()
+            if expected and expected != content_hash:
+                # Повреждённый файл загружается заново с начала
+                with open(path, 'wb'):
+                    pass
+                UploadSession.objects.filter(pk=session.pk).update(
+                    status='active', received_bytes=0, updated_at=timezone.now()
+                )
+                return Response({
+                    'success': False,
+                    'error': 'Контрольная сумма не совпадает, загрузите файл заново',
+                    'received_bytes': 0,
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            asset, created = store_media_file(
+                session.tenant, path, content_hash, session.type, upload_extension(session.filename)
+            )
+        except BaseException:
+            # Сессию можно завершить повторно
+            UploadSession.objects.filter(pk=session.pk, status='completing').update(status='active')
+            raise
+        session.status = 'completed'
+        session.media = asset
+        session.save(update_fields=['status', 'media', 'updated_at'])
+        return Response(
+            {**MediaAssetSerializer(asset).data, 'deduplicated': not created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
 
 class AnalyticsViewSet(viewsets.ViewSet):
@@ -124,71 +619,50 @@ class AnalyticsViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Получение статистики для дашборда"""
-        tenant = request.user.tenant
-        period = request.query_params.get('period', '7d')
-        
-        # Вычисляем дату начала периода
-        now = timezone.now()
-        if period == '7d':
-            start_date = now - timedelta(days=7)
-        elif period == '30d':
-            start_date = now - timedelta(days=30)
-        elif period == '90d':
-            start_date = now - timedelta(days=90)
-        else:
-            start_date = now - timedelta(days=7)
-        
-        # Получаем статистику
-        total_menus = Menu.objects.filter(tenant=tenant).count()
-        total_categories = Category.objects.filter(tenant=tenant).count()
-        total_items = Item.objects.filter(tenant=tenant).count()
+        """Получение статистики для дашборда
         
-        total_views = AnalyticsEvent.objects.filter(
-            tenant=tenant,
-            type__in=['view_category', 'open_item'],
-            timestamp__gte=start_date
-        ).count()
-        
-        total_plays = AnalyticsEvent.objects.filter(
-            tenant=tenant,
-            type__in=['play_preview', 'play_full'],
-            timestamp__gte=start_date
-        ).count()
+        Период задаётся как period=7d|30d|90d либо произвольным окном from/to
+        (ISO-дата или дата-время).
+        """
+        tenant = request.user.tenant
+        try:
+            resolve_period(request.query_params)
+        except PeriodError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        unique_users = AnalyticsEvent.objects.filter(
-            tenant=tenant,
-            timestamp__gte=start_date
-        ).values('session_id').distinct().count()
+        # Статистика кэшируется на тенант и период, см. api/dashboard.py
+        return Response(get_cached_stats(tenant, request.query_params))
+    
+    @action(detail=False, methods=['get'])
+    def events(self, request):
+        """Сырые события аналитики, новые первыми, с keyset-пагинацией
         
-        # Последняя активность
-        recent_activity = AnalyticsEvent.objects.filter(
-            tenant=tenant,
-            timestamp__gte=start_date
-        ).order_by('-timestamp')[:10]
+        Фильтры: type, session_id, item, from/to (как в stats).
+        """
+        params = request.query_params
+        events = AnalyticsEvent.objects.filter(tenant=request.user.tenant)
+        if params.get('from') or params.get('to'):
+            try:
+                start, end = resolve_period(params)
+            except PeriodError as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            events = events.filter(timestamp__gte=start, timestamp__lt=end)
+        if params.get('type'):
+            events = events.filter(type=params['type'])
+        if params.get('session_id'):
+            events = events.filter(session_id=params['session_id'])
+        if params.get('item'):
+            events = events.filter(item_id=params['item'])
         
-        # Топ блюда
-        top_items = Item.objects.filter(
-            tenant=tenant,
-            analytics_events__type__in=['open_item', 'play_preview', 'play_full'],
-            analytics_events__timestamp__gte=start_date
-        ).annotate(
-            interactions_count=Count('analytics_events')
-        ).order_by('-interactions_count')[:5]
-        
-        stats_data = {
-            'total_menus': total_menus,
-            'total_categories': total_categories,
-            'total_items': total_items,
-            'total_views': total_views,
-            'total_plays': total_plays,
-            'unique_users': unique_users,
-            'recent_activity': recent_activity,
-            'top_items': top_items,
-        }
-        
-        serializer = DashboardStatsSerializer(stats_data)
-        return Response(serializer.data)
+        paginator = EventKeysetPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response(AnalyticsEventSerializer(page, many=True).data)
     
     @action(detail=False, methods=['post'])
     def track(self, request):
@@ -196,7 +670,7 @@ class AnalyticsViewSet(viewsets.ViewSet):
         tenant = request.user.tenant
         data = request.data
         
-        event = AnalyticsEvent.objects.create(
+        event = AnalyticsEvent(
             tenant=tenant,
             session_id=data.get('session_id', ''),
             type=data.get('type', ''),
@@ -204,8 +678,36 @@ class AnalyticsViewSet(viewsets.ViewSet):
             item_id=data.get('item_id'),
             metadata_json=data.get('metadata', {}),
         )
+        queued = record_events([event])
         
-        return Response({'success': True, 'event_id': event.id})
+        return Response({'success': True, 'event_id': event.id, 'queued': queued})
+    
+    @action(detail=False, methods=['post'], url_path='track-batch')
+    def track_batch(self, request):
+        """Пакетная запись событий аналитики"""
+        data = request.data
+        raw_events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(raw_events, list):
+            return Response({
+                'success': False,
+                'error': 'Ожидается список событий в поле events'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_events) > settings.ANALYTICS_BATCH_MAX_EVENTS:
+            return Response({
+                'success': False,
+                'error': f'Не более {settings.ANALYTICS_BATCH_MAX_EVENTS} событий за запрос'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        events, errors = prepare_events(request.user.tenant, raw_events)
+        queued = record_events(events)
+        
+        return Response({
+            'success': not errors,
+            'queued': queued,
+            'accepted': len(events),
+            'rejected': len(errors),
+            'errors': errors,
+        })
 
 
 # Аутентификация
@@ -235,105 +737,44 @@ class CustomAuthToken(ObtainAuthToken):
 
 
 # Публичный API для гостевого меню
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
+from .public_menu import get_public_menu_snapshot, menu_etag, menu_last_modified
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def public_menu_view(request, tenant_slug):
     """Публичный API для получения меню по slug тенанта"""
     try:
-        # Получаем тенанта по slug
+        # Единственный индексированный запрос: тенант и версия его меню
         tenant = Tenant.objects.get(slug=tenant_slug, status='active')
-        
-        # Получаем все активные меню тенанта с категориями и блюдами
-        menus = Menu.objects.filter(
-            tenant=tenant,
-            active=True
-        ).prefetch_related(
-            'categories__items__prices',
-            'categories__items__item_media__media'
-        ).select_related('location')
-        
-        # Формируем данные для ответа
-        menu_data = {
-            'tenant': {
-                'name': tenant.name,
-                'slug': tenant.slug,
-                'theme': {
-                    'palette_json': tenant.theme_json or '{}',
-                    'logo_url': tenant.logo_url or '',
-                }
-            },
-            'menus': []
-        }
-        
-        for menu in menus:
-            menu_dict = {
-                'id': str(menu.id),
-                'name': menu.name,
-                'categories': []
-            }
-            
-            for category in menu.categories.all():
-                category_dict = {
-                    'id': str(category.id),
-                    'name': category.name,
-                    'items': []
-                }
-                
-                for item in category.items.all():
-                    item_dict = {
-                        'id': str(item.id),
-                        'name': item.name,
-                        'description': item.description or '',
-                        'tags': item.tags or [],
-                        'allergens': item.allergens or [],
-                        'weight_g': item.weight_g,
-                        'kcal': item.kcal,
-                        'prices': [],
-                        'item_media': []
-                    }
-                    
-                    # Добавляем цены
-                    for price in item.prices.all():
-                        item_dict['prices'].append({
-                            'amount_minor': price.amount_minor,
-                            'currency': price.currency,
-                        })
-                    
-                    # Добавляем медиа
-                    for item_media in item.item_media.all():
-                        media_dict = {
-                            'kind': item_media.kind,
-                            'media': {
-                                'type': item_media.media.type,
-                                'original_url': item_media.media.original_url or '',
-                                'hls_url': item_media.media.hls_url or '',
-                                'poster_url': item_media.media.poster_url or '',
-                                'duration_ms': item_media.media.duration_seconds * 1000 if item_media.media.duration_seconds else None,
-                            }
-                        }
-                        item_dict['item_media'].append(media_dict)
-                    
-                    category_dict['items'].append(item_dict)
-                
-                menu_dict['categories'].append(category_dict)
-            
-            menu_data['menus'].append(menu_dict)
-        
-        return Response({
-            'success': True,
-            'data': menu_data
-        })
-        
+
+        etag = quote_etag(menu_etag(tenant))
+        last_modified = menu_last_modified(tenant)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = HttpResponse(get_public_menu_snapshot(tenant), content_type='application/json')
+
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
     except Tenant.DoesNotExist:
         return Response({
             'success': False,
             'error': 'Ресторан не найден'
         }, status=404)
-    except Exception as e:
+    except Exception:
         return Response({
             'success': False,
             'error': 'Внутренняя ошибка сервера'
-        }, status=500)
\ No newline at end of file
+        }, status=500)
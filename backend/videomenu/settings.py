@@ -88,6 +88,63 @@ DATABASES = {
 }
 
 
+# Cache
+# Снапшоты публичного меню должны быть общими для всех воркеров, поэтому
+# в продакшене укажите общий бэкенд (Redis, Memcached, FileBasedCache)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='videomenu'),
+    }
+}
+
+# Время жизни снапшота публичного меню (секунды); сброс происходит по сигналам
+PUBLIC_MENU_SNAPSHOT_TTL = config('PUBLIC_MENU_SNAPSHOT_TTL', default=60 * 60 * 24, cast=int)
+
+
+# Analytics
+# Максимум событий в одном запросе analytics/track-batch/
+ANALYTICS_BATCH_MAX_EVENTS = config('ANALYTICS_BATCH_MAX_EVENTS', default=500, cast=int)
+ANALYTICS_BULK_BATCH_SIZE = config('ANALYTICS_BULK_BATCH_SIZE', default=500, cast=int)
+
+# Агрегаты аналитики учитывают только события старше этого порога (секунды)
+ANALYTICS_ROLLUP_SETTLE_SECONDS = config('ANALYTICS_ROLLUP_SETTLE_SECONDS', default=60, cast=int)
+
+# Сколько дней хранить сырые события по тарифу тенанта (команда prune_analytics);
+# старые события остаются в агрегатах и выгружаются в архив
+ANALYTICS_RETENTION_DAYS = {
+    'free': 30,
+    'basic': 90,
+    'premium': 365,
+    'enterprise': 730,
+}
+ANALYTICS_ARCHIVE_ROOT = Path(config('ANALYTICS_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive' / 'analytics')))
+# Почасовые агрегаты старше этого срока удаляются, окна в этом прошлом
+# считаются с точностью до суток
+ANALYTICS_HOURLY_ROLLUP_DAYS = config('ANALYTICS_HOURLY_ROLLUP_DAYS', default=100, cast=int)
+
+# Кэш статистики дашборда: FRESH_SECONDS данные считаются свежими, до
+# STALE_SECONDS отдаются устаревшие с фоновым пересчётом (0 — без кэша)
+ANALYTICS_STATS_CACHE = {
+    'FRESH_SECONDS': config('ANALYTICS_STATS_FRESH_SECONDS', default=30, cast=int),
+    'STALE_SECONDS': config('ANALYTICS_STATS_STALE_SECONDS', default=300, cast=int),
+    'LOCK_SECONDS': 30,
+    'REFRESH_WORKERS': 2,
+}
+
+# Буфер отложенной записи событий (по одному на воркер). Выключен по
+# умолчанию: события пишутся синхронно, что удобно для тестов.
+# OVERFLOW: 'drop' — отбрасывать события при переполнении,
+# 'block' — сбрасывать буфер в потоке запроса.
+ANALYTICS_BUFFER = {
+    'ENABLED': config('ANALYTICS_BUFFER_ENABLED', default=False, cast=bool),
+    'MAX_EVENTS': config('ANALYTICS_BUFFER_MAX_EVENTS', default=10000, cast=int),
+    'FLUSH_EVENTS': config('ANALYTICS_BUFFER_FLUSH_EVENTS', default=500, cast=int),
+    'FLUSH_INTERVAL': config('ANALYTICS_BUFFER_FLUSH_INTERVAL', default=2.0, cast=float),
+    'OVERFLOW': config('ANALYTICS_BUFFER_OVERFLOW', default='drop'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,6 +184,52 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Публичный адрес бэкенда для ссылок на файлы из MEDIA_ROOT в ответах API
+MEDIA_BASE_URL = config('MEDIA_BASE_URL', default='http://localhost:8000')
+# Сколько секунд клиенты могут кэшировать файлы из MEDIA_ROOT
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=3600, cast=int)
+# Префикс internal-location nginx (например /protected-media/): если задан,
+# файлы отдаёт nginx по заголовку X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
+
+# Лестница ширин уменьшенных постеров (WebP и JPEG)
+IMAGE_VARIANT_WIDTHS = [160, 320, 480, 640, 960]
+IMAGE_VARIANT_QUALITY = 80
+
+# Метаданные локальных медиа (размер, разрешение, длительность)
+FFPROBE_BINARY = config('FFPROBE_BINARY', default='ffprobe')
+MEDIA_PROBE_ON_CREATE = config('MEDIA_PROBE_ON_CREATE', default=True, cast=bool)
+MEDIA_PROBE_WORKERS = 2
+
+# Загрузка медиа по частям: части копятся в UPLOAD_SESSION_ROOT, готовый
+# файл переносится в MEDIA_ROOT/uploads/
+UPLOAD_SESSION_ROOT = BASE_DIR / 'upload_sessions'
+MEDIA_UPLOAD_MAX_BYTES = config('MEDIA_UPLOAD_MAX_BYTES', default=2 * 1024 ** 3, cast=int)
+MEDIA_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+MEDIA_UPLOAD_SESSION_DAYS = 2
+
+# HLS-упаковка видео в MEDIA_ROOT/hls/: рендишены выше исходника пропускаются
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+HLS_SEGMENT_SECONDS = 4
+HLS_WORKERS = config('HLS_WORKERS', default=2, cast=int)
+HLS_LADDER = [
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1400, 'audio_bitrate': 128},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 192},
+]
+
+# QR-коды генерируются локально и кэшируются в MEDIA_ROOT/qr/
+QR_CODE = {
+    'FORMAT': 'png',
+    'SIZE': config('QR_CODE_SIZE', default=300, cast=int),
+    'ERROR_LEVEL': config('QR_CODE_ERROR_LEVEL', default='M'),
+    'BORDER': 2,
+}
+# Пачки QR-кодов от этого размера рендерятся в пуле процессов
+QR_PARALLEL_THRESHOLD = 16
+QR_RENDER_WORKERS = config('QR_RENDER_WORKERS', default=0, cast=int)  # 0 — по числу ядер
+QR_BULK_MAX_TABLES = 500
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field